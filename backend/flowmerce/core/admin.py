@@ -1,6 +1,7 @@
-from django.contrib import admin
+from django.contrib import admin, messages
 
-from .models import User, Product, Category, Tag, Order, OrderItem, Profile, SubscriptionGrant, Subscription, Plan, PlanPrice, Feature, FeaturePrice, UserFeatureSubscription, Payment, PaymentRequest
+from .models import User, Product, Category, Tag, Order, OrderItem, Profile, SubscriptionGrant, Subscription, Plan, PlanPrice, Feature, FeaturePrice, UserFeatureSubscription, Payment, PaymentRequest, OutboundEmail
+from .stock import reserve_stock
 
 admin.site.register(User)
 
@@ -21,7 +22,21 @@ class OrderAdmin(admin.ModelAdmin):
     list_filter = ('status', 'employee')
     search_fields = ('employee__email',)
 
-admin.site.register(OrderItem) 
+
+
+@admin.register(OrderItem)
+class OrderItemAdmin(admin.ModelAdmin):
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        # The API reserves stock in create_order; items added here need it too
+        if not change:
+            for line in reserve_stock([obj]):
+                self.message_user(
+                    request,
+                    f"Product {line['product']} oversold: requested {line['requested']}, "
+                    f"{line['available']} in stock",
+                    messages.WARNING,
+                )
 
 @admin.register(Profile)
 class ProfileAdmin(admin.ModelAdmin):
@@ -90,6 +105,13 @@ admin.site.register(UserFeatureSubscription)
 admin.site.register(Payment)
 
 
+@admin.register(OutboundEmail)
+class OutboundEmailAdmin(admin.ModelAdmin):
+    list_display = ('recipient', 'subject', 'status', 'attempts', 'created_at', 'sent_at')
+    list_filter = ('status',)
+    search_fields = ('recipient', 'subject')
+
+
 admin.site.site_header = 'Flowmerce Admin'
 admin.site.site_title = 'Flowmerce Admin Portal'
 admin.site.index_title = 'Welcome to Flowmerce Admin'
\ No newline at end of file
@@ -0,0 +1,53 @@
+from django.db.models import Sum
+
+from .cache import Namespace
+from .models import DailySalesRollup, Order, OrderItem, Product
+
+SUMMARY_CACHE_TIMEOUT = 60 * 60
+
+summaries = Namespace('analytics_summary', timeout=SUMMARY_CACHE_TIMEOUT)
+
+
+def build_summary(user):
+    """
+    Compute the dashboard summary. Order totals and status counts are summed
+    from the user's daily rollup rows rather than the raw order table.
+    """
+    totals = DailySalesRollup.objects.filter(employee=user).aggregate(
+        total_orders=Sum('order_count'),
+        total_revenue=Sum('revenue'),
+        **{
+            f"status_{status}": Sum(field)
+            for status, field in DailySalesRollup.STATUS_FIELDS.items()
+        }
+    )
+    total_orders = totals['total_orders'] or 0
+    total_revenue = totals['total_revenue'] or 0
+
+    top_products = list(
+        OrderItem.objects.filter(order__employee=user)
+        .values('product__title')
+        .annotate(total_sold=Sum('quantity'))
+        .order_by('-total_sold')[:5]
+    )
+
+    return {
+        "total_orders": total_orders,
+        "total_revenue": total_revenue,
+        "avg_order_value": total_revenue / total_orders if total_orders else 0,
+        "total_products": Product.objects.filter(owner=user).count(),
+        "top_products": top_products,
+        "status_counts": [
+            {"status": status, "count": totals[f"status_{status}"]}
+            for status, _ in Order.STATUS_CHOICES
+            if totals[f"status_{status}"]
+        ],
+    }
+
+
+def get_summary(user):
+    return summaries.get_or_set(user.id, lambda: build_summary(user))
+
+
+def invalidate_summary(user_id):
+    summaries.invalidate(user_id)
@@ -0,0 +1,83 @@
+import hashlib
+import json
+import re
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+
+
+def normalize_message(message):
+    return re.sub(r"\s+", " ", message).strip().lower()
+
+
+def replay_chunks(text):
+    """Split a cached completion back into word chunks for streaming."""
+    for word in re.findall(r"\S+\s*|\s+", text):
+        yield word
+
+
+class ResponseCache:
+    """
+    Size-bounded, TTL-expiring cache of assistant completions, kept per
+    process. Entries are keyed on the normalized question, the business
+    stats the prompt was built from and the model options, so a cached
+    answer is only replayed when the model would see the same prompt.
+    """
+
+    def __init__(self, max_size, ttl):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def key(self, message, stats, payload):
+        material = json.dumps(
+            [
+                normalize_message(message),
+                stats,
+                payload["model"],
+                payload["options"],
+            ],
+            sort_keys=True,
+            default=str,
+        )
+        return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None and entry[0] > time.monotonic():
+                self._data.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+
+            if entry is not None:
+                del self._data[key]
+            self.misses += 1
+            return None
+
+    def set(self, key, text):
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, text)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.hits = self.misses = 0
+
+    def stats(self):
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "size": len(self._data)}
+
+
+response_cache = ResponseCache(
+    max_size=settings.ASSISTANT_CACHE_SIZE,
+    ttl=settings.ASSISTANT_CACHE_TTL,
+)
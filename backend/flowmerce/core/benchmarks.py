@@ -0,0 +1,278 @@
+import json
+import platform
+import statistics
+import subprocess
+import time
+import timeit
+from contextlib import ExitStack, contextmanager
+from itertools import cycle
+
+import django
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, close_old_connections, connections
+from django.db.utils import load_backend
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import resolve
+from django.utils import timezone
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from .catalog import invalidate_products
+from .middleware.instrumentation import percentile
+from .middleware.subscription_middleware import WHITELISTED_URL_NAMES
+from .models import Order, OutboundEmail, Product
+from .seeding import SEED_PASSWORD
+
+
+def client_host():
+    hosts = [host for host in settings.ALLOWED_HOSTS if host and host != '*']
+    return hosts[0].lstrip('.') if hosts else 'localhost'
+
+
+class Tenant:
+    """A seeded user with an authenticated test client and some product ids."""
+
+    def __init__(self, user):
+        self.user = user
+        token = RefreshToken.for_user(user).access_token
+        self.client = Client(
+            HTTP_HOST=client_host(),
+            HTTP_AUTHORIZATION=f"Bearer {token}",
+        )
+        self.product_ids = list(
+            Product.objects.filter(owner=user).values_list('id', flat=True)[:20]
+        )
+
+
+def order_create(tenant, lines=5):
+    payload = {
+        'status': Order.COMPLETED,
+        'items': [
+            {'product': pk, 'quantity': 1} for pk in tenant.product_ids[:lines]
+        ],
+    }
+    return tenant.client.post('/api/orders/', payload, content_type='application/json')
+
+
+def login(tenant):
+    return tenant.client.post(
+        '/api/login/',
+        {'email': tenant.user.email, 'password': SEED_PASSWORD},
+        content_type='application/json',
+    )
+
+
+# name -> (request, expected status, uses the expired tenants)
+SCENARIOS = {
+    'product_list': (lambda t: t.client.get('/api/products/'), 200, False),
+    'order_list': (lambda t: t.client.get('/api/orders/'), 200, False),
+    'order_list_summary': (
+        lambda t: t.client.get('/api/orders/?view=summary&pagination=cursor'), 200, False
+    ),
+    'analytics_summary': (lambda t: t.client.get('/api/analytics/summary/'), 200, False),
+    'monthly_sales': (lambda t: t.client.get('/api/analytics/monthly-sales/'), 200, False),
+    'subscription_gate': (lambda t: t.client.get('/api/products/'), 403, True),
+    'login': (login, 200, False),
+    # Writes last, so the read scenarios see the same data on every run
+    'order_create': (order_create, 201, False),
+}
+
+
+@contextmanager
+def capture_queries():
+    """Captures queries per database alias, so replica reads are counted too."""
+    with ExitStack() as stack:
+        yield {
+            alias: stack.enter_context(CaptureQueriesContext(connections[alias]))
+            for alias in connections
+        }
+
+
+def run_scenario(name, tenants, iterations, warmup=2):
+    request, expected, _ = SCENARIOS[name]
+    clients = cycle(tenants)
+
+    for _ in range(warmup):
+        request(next(clients))
+
+    timings = []
+    queries = {alias: [] for alias in connections}
+    errors = 0
+    started = time.perf_counter()
+    for _ in range(iterations):
+        tenant = next(clients)
+        with capture_queries() as captured:
+            start = time.perf_counter()
+            response = request(tenant)
+            timings.append((time.perf_counter() - start) * 1000)
+        for alias, context in captured.items():
+            queries[alias].append(len(context))
+        # End the request the way the handler does, so connection setup
+        # (or reuse from the pool) is part of what is measured
+        close_old_connections()
+        if response.status_code != expected:
+            errors += 1
+    elapsed = time.perf_counter() - started
+
+    timings.sort()
+    totals = [sum(counts) for counts in zip(*queries.values())]
+    return {
+        'iterations': iterations,
+        'errors': errors,
+        'throughput_rps': round(iterations / elapsed, 2) if elapsed else None,
+        'latency_ms': {
+            'mean': round(statistics.fmean(timings), 2),
+            'p50': percentile(timings, 50),
+            'p95': percentile(timings, 95),
+            'p99': percentile(timings, 99),
+        },
+        'queries': {
+            'mean': round(statistics.fmean(totals), 2),
+            'max': max(totals),
+            'by_alias': {
+                alias: round(statistics.fmean(counts), 2) for alias, counts in queries.items()
+            },
+        },
+    }
+
+
+GATE_PATHS = ['/api/products/', '/api/orders/', '/api/analytics/summary/', '/api/payments/request/']
+
+
+def gate_whitelist_overhead(paths=GATE_PATHS, number=2000, repeat=3):
+    """
+    Per-request cost, in microseconds, of SubscriptionMiddleware's whitelist
+    check: resolving the path a second time against a list of names, as the
+    gate did in __call__, versus reading the match Django already resolved
+    for process_view against the frozenset. Best of `repeat` runs.
+    """
+    names = list(WHITELISTED_URL_NAMES)
+    matches = [resolve(path) for path in paths]
+
+    def resolve_again():
+        for path in paths:
+            resolve(path).url_name in names
+
+    def resolved_match():
+        for match in matches:
+            match.url_name in WHITELISTED_URL_NAMES
+
+    def per_request(check):
+        best = min(timeit.repeat(check, number=number, repeat=repeat))
+        return round(best / (number * len(paths)) * 1e6, 3)
+
+    return {
+        'paths': paths,
+        'resolve_again_us': per_request(resolve_again),
+        'resolver_match_us': per_request(resolved_match),
+    }
+
+
+def connection_checkout(alias=DEFAULT_DB_ALIAS, number=20):
+    """
+    Milliseconds to open a connection for a request and close it at its
+    end: a new connection, with its TCP and auth handshake, versus one
+    borrowed from the pool. Mean of `number` checkouts; pooled_ms is None
+    when the backend has no pool.
+    """
+    settings_dict = connections[alias].settings_dict
+    backend = load_backend(settings_dict['ENGINE'])
+    options = settings_dict.get('POOL') or {}
+
+    def per_checkout(max_size):
+        wrapper = backend.DatabaseWrapper(
+            {**settings_dict, 'POOL': {**options, 'MAX_SIZE': max_size}},
+            f"{alias}-checkout",
+        )
+        pool = getattr(wrapper, 'pool', None)
+        if max_size and pool is None:
+            return None
+        # Warm up, so the pooled runs measure reuse only
+        wrapper.ensure_connection()
+        wrapper.close()
+
+        start = time.perf_counter()
+        for _ in range(number):
+            wrapper.ensure_connection()
+            wrapper.close()
+        elapsed = time.perf_counter() - start
+        if pool is not None:
+            pool.close()
+        return round(elapsed / number * 1000, 3)
+
+    return {
+        'alias': alias,
+        'connect_ms': per_checkout(0),
+        'pooled_ms': per_checkout(max(options.get('MAX_SIZE', 0), 1)),
+    }
+
+
+def git_revision():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            capture_output=True, text=True, check=True, cwd=settings.BASE_DIR,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_benchmarks(active_users, expired_users, scenarios, iterations, dataset):
+    """
+    Run each scenario against the seeded tenants and return a JSON-ready
+    report. Orders and emails created by order_create are removed again
+    and the stock it reserved is put back, so repeated runs see the same
+    data.
+    """
+    active = [Tenant(user) for user in active_users]
+    expired = [Tenant(user) for user in expired_users]
+    first_order = Order.objects.order_by('-id').values_list('id', flat=True).first() or 0
+    products = list(
+        Product.objects.filter(owner__in=active_users).only('owner', 'stock', 'status', 'updated_at')
+    )
+
+    results = {}
+    for name in scenarios:
+        tenants = expired if SCENARIOS[name][2] else active
+        if not tenants:
+            continue
+        results[name] = run_scenario(name, tenants, iterations)
+
+    Order.objects.filter(
+        id__gt=first_order, employee__in=active_users
+    ).delete()
+    OutboundEmail.objects.filter(
+        recipient__in=[user.email for user in active_users]
+    ).delete()
+    Product.objects.bulk_update(products, ['stock', 'status', 'updated_at'], batch_size=500)
+    # bulk_update sends no signals
+    for user in active_users:
+        invalidate_products(user.pk)
+
+    db = connections['default']
+    return {
+        'revision': git_revision(),
+        'created_at': timezone.now().isoformat(),
+        'environment': {
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'database': db.vendor,
+            'conn_max_age': db.settings_dict['CONN_MAX_AGE'],
+            'pool_size': (db.settings_dict.get('POOL') or {}).get('MAX_SIZE', 0),
+            'debug': settings.DEBUG,
+        },
+        'dataset': dataset,
+        'scenarios': results,
+        'microbenchmarks': {
+            'subscription_gate_whitelist': gate_whitelist_overhead(),
+            'connection_checkout': connection_checkout(),
+        },
+    }
+
+
+def dump_report(report, path=None):
+    text = json.dumps(report, indent=2, sort_keys=True)
+    if path:
+        with open(path, 'w') as handle:
+            handle.write(text + '\n')
+    return text
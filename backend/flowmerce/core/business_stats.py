@@ -0,0 +1,135 @@
+from django.core.cache import cache
+from django.db.models import CharField, F, IntegerField, Max, Sum, Value
+from django.utils import timezone
+
+from .cache import Namespace
+from .models import DailySalesRollup, OrderItem
+
+# Backstop only; entries are kept fresh by order write events
+STATS_CACHE_TIMEOUT = 60 * 60 * 24
+TOP_PRODUCTS = 5
+
+stats = Namespace('business_stats', timeout=STATS_CACHE_TIMEOUT)
+
+
+def stats_lock_key(user_id):
+    return f"business_stats_lock_{user_id}"
+
+
+def month_start(now=None):
+    local = timezone.localtime(now)
+    return local.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+
+def month_label(when=None):
+    return timezone.localtime(when).strftime("%Y-%m")
+
+
+def month_stats_query(user, start):
+    """
+    One UNION ALL query: a totals row from the daily rollup (product_key
+    NULL, amount = revenue), then one row per product sold this month
+    (amount = units). Grouped by product, so a renamed product stays one
+    row under its current title.
+    """
+    totals = (
+        DailySalesRollup.objects.filter(employee=user, day__gte=start.date())
+        .values('employee_id')
+        .annotate(
+            product_key=Value(None, IntegerField()),
+            title=Value('', CharField()),
+            amount=Sum('revenue'),
+            orders=Sum('order_count'),
+        )
+        .values_list('product_key', 'title', 'amount', 'orders')
+        .order_by()
+    )
+    sold = (
+        OrderItem.objects.filter(order__employee=user, order__created_at__gte=start)
+        .values('product_id')
+        .annotate(
+            product_key=F('product_id'),
+            title=Max('product__title'),
+            amount=Sum('quantity'),
+            orders=Value(0, IntegerField()),
+        )
+        .values_list('product_key', 'title', 'amount', 'orders')
+        .order_by()
+    )
+    return totals.union(sold, all=True)
+
+
+def compute_month_stats(user):
+    """Month-to-date revenue, order count and units sold per product."""
+    start = month_start()
+    raw = {"month": month_label(start), "revenue": 0, "orders": 0, "products": {}}
+
+    for product_id, title, amount, orders in month_stats_query(user, start):
+        if product_id is None:
+            raw["revenue"] = amount or 0
+            raw["orders"] = orders or 0
+        else:
+            raw["products"][product_id] = (title, amount)
+    return raw
+
+
+def is_current(raw, month):
+    return raw is not None and raw["month"] == month
+
+
+def format_stats(raw):
+    top = sorted(raw["products"].values(), key=lambda pair: pair[1], reverse=True)[:TOP_PRODUCTS]
+    return {
+        "revenue": raw["revenue"],
+        "orders": raw["orders"],
+        "top": (
+            ", ".join(f"{title} ({total} sold)" for title, total in top)
+            if top
+            else "No sales data available yet."
+        ),
+    }
+
+
+def get_business_stats(user):
+    version = stats.version(user.id)
+    raw = stats.get(user.id, version=version)
+    if not is_current(raw, month_label()):
+        # Stored under the version read first, so an order recorded meanwhile wins
+        raw = compute_month_stats(user)
+        stats.set(user.id, raw, version=version)
+    return format_stats(raw)
+
+
+def record_new_order(order):
+    """
+    Fold a newly committed order into the cached stats instead of dropping
+    them. Falls back to invalidation when another update holds the entry.
+    """
+    scope = order.employee_id
+
+    if not cache.add(stats_lock_key(scope), 1, timeout=10):
+        stats.bump(scope)
+        return
+
+    try:
+        raw = stats.get(scope)
+        # A recompute still in flight may have missed this order; retire it
+        version = stats.bump(scope)
+        if not is_current(raw, month_label(order.created_at)):
+            return
+
+        raw = {**raw, "products": dict(raw["products"])}
+        raw["revenue"] += order.amount or 0
+        raw["orders"] += 1
+        items = order.items.values_list('product_id', 'product__title', 'quantity')
+        for product_id, title, quantity in items:
+            _, sold = raw["products"].get(product_id, (title, 0))
+            raw["products"][product_id] = (title, sold + quantity)
+
+        stats.set(scope, raw, version=version)
+    finally:
+        cache.delete(stats_lock_key(scope))
+
+
+def invalidate_business_stats(user_id):
+    stats.invalidate(user_id)
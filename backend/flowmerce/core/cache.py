@@ -0,0 +1,109 @@
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import cache as shared
+from django.db import transaction
+
+MISSING = object()
+
+
+class LocalLRU:
+    """Small thread-safe LRU map kept per worker process."""
+
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            value = self._data.get(key, MISSING)
+            if value is not MISSING:
+                self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+class Namespace:
+    """
+    Two-tier cache for one kind of value, e.g. analytics summaries.
+
+    Values live in the shared cache (settings.CACHES['default']) under
+    "<name>:<scope>:v<version>[:<part>]", with a bounded per-process LRU in
+    front. Each scope, usually a user id, has a version kept in the shared
+    cache. invalidate() bumps it once the transaction commits, which
+    retires every value of the scope in every worker at once. Lookups read
+    the version first, so the local tier never serves a stale value, and
+    a value computed while an invalidation happens is stored under the old
+    version where nothing reads it.
+    """
+
+    def __init__(self, name, timeout=None, local_size=None):
+        self.name = name
+        self.timeout = timeout
+        self.local = LocalLRU(local_size or settings.LOCAL_CACHE_SIZE)
+
+    def version_key(self, scope):
+        return f"{self.name}:{scope}:version"
+
+    def key(self, scope, version, part=None):
+        key = f"{self.name}:{scope}:v{version}"
+        return f"{key}:{part}" if part is not None else key
+
+    def version(self, scope):
+        version = shared.get(self.version_key(scope))
+        if version is None:
+            # Time based so a lost version key never revives old values
+            shared.add(self.version_key(scope), time.time_ns(), timeout=None)
+            version = shared.get(self.version_key(scope))
+        return version
+
+    def get(self, scope, part=None, default=None, version=None):
+        key = self.key(scope, version or self.version(scope), part)
+
+        value = self.local.get(key)
+        if value is MISSING:
+            value = shared.get(key, MISSING)
+            if value is MISSING:
+                return default
+            self.local.set(key, value)
+        return value
+
+    def set(self, scope, value, part=None, version=None):
+        key = self.key(scope, version or self.version(scope), part)
+        shared.set(key, value, timeout=self.timeout)
+        self.local.set(key, value)
+
+    def get_or_set(self, scope, compute, part=None):
+        """Return the cached value, computing and storing it on a miss."""
+        version = self.version(scope)
+        value = self.get(scope, part, MISSING, version)
+        if value is MISSING:
+            value = compute()
+            self.set(scope, value, part, version)
+        return value
+
+    def bump(self, scope):
+        """Move the scope to a new version right away and return it."""
+        try:
+            return shared.incr(self.version_key(scope))
+        except ValueError:
+            version = time.time_ns()
+            shared.set(self.version_key(scope), version, timeout=None)
+            return version
+
+    def invalidate(self, scope):
+        # Only once the write is visible to other requests
+        transaction.on_commit(lambda: self.bump(scope))
@@ -0,0 +1,154 @@
+import copy
+import hashlib
+import threading
+import time
+
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import quote_etag
+
+from .cache import Namespace
+from .models import Category, Tag
+
+# Categories and tags are shared by every tenant
+CATEGORIES = 'categories'
+TAGS = 'tags'
+
+# scope -> LookupTable
+lookup_tables = {}
+
+versions = Namespace('catalog')
+
+
+def bump(scope):
+    versions.bump(scope)
+    if scope in lookup_tables:
+        lookup_tables[scope].clear()
+
+
+def invalidate(scope):
+    transaction.on_commit(lambda: bump(scope))
+
+
+def invalidate_products(owner_id):
+    if owner_id:
+        invalidate(owner_id)
+
+
+def invalidate_taxonomy():
+    invalidate(CATEGORIES)
+    invalidate(TAGS)
+
+
+def catalog_etag(scopes, *parts):
+    """
+    ETag for a response built from the given scopes, read from the shared
+    cache only. parts vary it for the same versions, e.g. the URL, the
+    user or the response format.
+    """
+    tokens = [f"{scope}:{versions.version(scope)}" for scope in scopes]
+    digest = hashlib.md5('|'.join([*tokens, *map(str, parts)]).encode()).hexdigest()
+    return quote_etag(digest)
+
+
+class LookupTable:
+    """
+    All rows of a small, admin-managed table, kept in memory per process.
+    Reloaded when this process commits a change to it, or within
+    recheck_after seconds of its catalog version moving on in another
+    worker.
+
+    Rows are always read from the primary: a table loaded from a lagging
+    replica would be kept under the current version. get() hands out
+    copies, as callers assign the rows to other objects.
+    """
+
+    recheck_after = 1
+
+    def __init__(self, model, scope):
+        self.model = model
+        self.scope = scope
+        self.objects = model._default_manager.db_manager(DEFAULT_DB_ALIAS)
+        # (rows by pk, version they were loaded at, monotonic time of last check)
+        self._state = None
+        self._lock = threading.Lock()
+        lookup_tables[scope] = self
+
+    def rows(self):
+        state = self._state
+        now = time.monotonic()
+        if state is not None and now - state[2] < self.recheck_after:
+            return state[0]
+
+        version = versions.version(self.scope)
+        with self._lock:
+            state = self._state
+            if state is None or state[1] != version:
+                # Read after the version, so a concurrent write reloads again
+                state = ({row.pk: row for row in self.objects.all()}, version, now)
+            else:
+                state = (state[0], version, now)
+            self._state = state
+        return state[0]
+
+    def get(self, pk):
+        row = self.rows().get(pk)
+        if row is None:
+            # Possibly created since the last load, or in this transaction
+            return self.objects.filter(pk=pk).first()
+        return copy.copy(row)
+
+    def existing(self, pks):
+        """The subset of pks that exist; only unknown ones are queried."""
+        rows = self.rows()
+        found = {pk for pk in pks if pk in rows}
+        unknown = set(pks) - found
+        if unknown:
+            found.update(self.objects.filter(pk__in=unknown).values_list('pk', flat=True))
+        return found
+
+    def clear(self):
+        self._state = None
+
+    def __deepcopy__(self, memo):
+        # Shared by every serializer field that DRF copies per instance
+        return self
+
+
+category_table = LookupTable(Category, CATEGORIES)
+tag_table = LookupTable(Tag, TAGS)
+
+
+class ConditionalListMixin:
+    """
+    Answers list requests with 304 Not Modified while the catalog versions
+    they depend on are unchanged, before any query or serializer runs.
+
+    There is no Last-Modified: its whole seconds can't tell apart two
+    writes within the same second, so If-Modified-Since alone could get a
+    stale 304. Clients revalidate with If-None-Match.
+    """
+
+    # Catalog scopes the list is built from; see get_catalog_scopes()
+    catalog_scopes = None
+
+    def get_catalog_scopes(self):
+        assert self.catalog_scopes is not None, (
+            "'%s' should either include a `catalog_scopes` attribute, or override "
+            "the `get_catalog_scopes()` method." % self.__class__.__name__
+        )
+        return self.catalog_scopes
+
+    def list(self, request, *args, **kwargs):
+        etag = catalog_etag(
+            self.get_catalog_scopes(),
+            request.get_full_path(), request.user.pk, request.accepted_renderer.format,
+        )
+        response = get_conditional_response(request, etag=etag)
+        if response is None:
+            response = super().list(request, *args, **kwargs)
+
+        response.headers['ETag'] = etag
+        # Always revalidate; lists differ per user
+        patch_cache_control(response, private=True, no_cache=True)
+        return response
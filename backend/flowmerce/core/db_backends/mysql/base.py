@@ -0,0 +1,11 @@
+from django.db.backends.mysql.base import DatabaseWrapper as MySQLDatabaseWrapper
+
+from ..pool import PooledDatabaseWrapperMixin
+
+
+class DatabaseWrapper(PooledDatabaseWrapperMixin, MySQLDatabaseWrapper):
+    """django.db.backends.mysql with a per-process connection pool."""
+
+    def check_pooled_connection(self, connection):
+        # No silent reconnect: a new session would lack the init_command state
+        connection.ping(False)
@@ -0,0 +1,201 @@
+import os
+import threading
+import time
+from collections import deque
+
+from django.db import DatabaseError
+
+
+class PoolExhausted(DatabaseError):
+    pass
+
+
+class ConnectionPool:
+    """
+    Thread-safe pool of raw DB-API connections for one database in one
+    process. At most max_size connections are open at a time, counting the
+    ones in use. Idle connections are pinged before reuse once they have
+    been idle for check_after seconds, and closed once older than
+    max_lifetime, ahead of the server's own idle timeout.
+    """
+
+    def __init__(self, max_size, timeout=10, max_lifetime=3600, check_after=30):
+        self.max_size = max_size
+        self.timeout = timeout
+        self.max_lifetime = max_lifetime
+        self.check_after = check_after
+        self._slots = threading.BoundedSemaphore(max_size)
+        self._idle = deque()
+        self._created = {}
+        self._lock = threading.Lock()
+        self.closed = False
+
+    def acquire(self, connect, check):
+        """
+        Return (connection, reused). New connections come from connect();
+        idle ones are validated with check(), which raises if they are dead.
+        """
+        if not self._slots.acquire(timeout=self.timeout):
+            raise PoolExhausted(
+                f"No database connection became free within {self.timeout}s "
+                f"({self.max_size} in use)"
+            )
+
+        try:
+            while True:
+                with self._lock:
+                    if not self._idle:
+                        break
+                    connection, returned_at = self._idle.pop()
+
+                now = time.monotonic()
+                if now - self._created[id(connection)] > self.max_lifetime:
+                    self._discard(connection)
+                    continue
+                if now - returned_at > self.check_after:
+                    try:
+                        check(connection)
+                    except Exception:
+                        self._discard(connection)
+                        continue
+                return connection, True
+
+            connection = connect()
+            with self._lock:
+                self._created[id(connection)] = time.monotonic()
+            return connection, False
+        except BaseException:
+            self._slots.release()
+            raise
+
+    def release(self, connection, reusable=True):
+        with self._lock:
+            reusable = reusable and not self.closed and id(connection) in self._created
+            if reusable:
+                self._idle.append((connection, time.monotonic()))
+        if not reusable:
+            self._discard(connection)
+        self._slots.release()
+
+    def close(self):
+        """Close the idle connections; ones in use are closed when released."""
+        with self._lock:
+            self.closed = True
+            idle = [connection for connection, _ in self._idle]
+            self._idle.clear()
+        for connection in idle:
+            self._discard(connection)
+
+    def _discard(self, connection):
+        with self._lock:
+            self._created.pop(id(connection), None)
+        try:
+            connection.close()
+        except Exception:
+            pass
+
+    def stats(self):
+        with self._lock:
+            return {'open': len(self._created), 'idle': len(self._idle), 'max_size': self.max_size}
+
+
+# Settings that decide which database a connection talks to
+TARGET_SETTINGS = ('ENGINE', 'NAME', 'HOST', 'PORT', 'USER')
+
+# (alias, pid) -> (target, pool)
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(alias, settings_dict):
+    """
+    The pool for this alias in this process. When the alias is pointed at
+    another database, e.g. by the test runner switching NAME to the test
+    database, the old pool is drained and a new one started.
+    """
+    options = settings_dict.get('POOL') or {}
+    target = tuple(settings_dict.get(name) for name in TARGET_SETTINGS)
+    # Keyed by pid: connections must not be shared with a forked worker
+    key = (alias, os.getpid())
+    with _pools_lock:
+        current = _pools.get(key)
+        if current is not None and current[0] == target:
+            return current[1]
+        if current is not None:
+            current[1].close()
+        pool = ConnectionPool(
+            max_size=options.get('MAX_SIZE', 10),
+            timeout=options.get('TIMEOUT', 10),
+            max_lifetime=options.get('MAX_LIFETIME', 3600),
+            check_after=options.get('CHECK_AFTER', 30),
+        )
+        _pools[key] = (target, pool)
+        return pool
+
+
+class PooledDatabaseWrapperMixin:
+    """
+    Makes a database backend borrow connections from a per-process pool
+    instead of opening one per request, when settings_dict['POOL'] has a
+    MAX_SIZE above 0. Closing a connection, e.g. at the end of a request,
+    returns it to the pool, so connections never outlive a request inside
+    a thread. That keeps it safe under ASGI, where requests hop between
+    threads, unlike CONN_MAX_AGE.
+    """
+
+    _borrowed_from = None
+
+    def check_pooled_connection(self, connection):
+        """
+        Raise if an idle DB-API connection is no longer usable. Backends
+        with a cheaper native check, like MySQL's ping, override this.
+        """
+        cursor = connection.cursor()
+        try:
+            cursor.execute('SELECT 1')
+        finally:
+            cursor.close()
+
+    @property
+    def pool(self):
+        options = self.settings_dict.get('POOL') or {}
+        if options.get('MAX_SIZE', 0) <= 0:
+            return None
+        return get_pool(self.alias, self.settings_dict)
+
+    def get_new_connection(self, conn_params):
+        pool = self.pool
+        if pool is None:
+            return super().get_new_connection(conn_params)
+
+        connection, self._pool_reused = pool.acquire(
+            lambda: super(PooledDatabaseWrapperMixin, self).get_new_connection(conn_params),
+            self.check_pooled_connection,
+        )
+        # Returned there even if the settings have moved on meanwhile
+        self._borrowed_from = pool
+        return connection
+
+    def init_connection_state(self):
+        # Session settings survive on a pooled connection
+        if getattr(self, '_pool_reused', False):
+            return
+        super().init_connection_state()
+
+    def _close(self):
+        pool = self._borrowed_from
+        if pool is None or self.connection is None:
+            return super()._close()
+
+        # Closed inside a transaction (an error path): never hand it out again
+        reusable = not self.in_atomic_block
+        if reusable and not self.get_autocommit():
+            try:
+                self.connection.rollback()
+            except Exception:
+                reusable = False
+        if reusable and self.errors_occurred:
+            reusable = self.is_usable()
+        pool.release(self.connection, reusable=reusable)
+        self._borrowed_from = None
+        self._pool_reused = False
@@ -0,0 +1,86 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, connections
+
+REPLICA = 'replica'
+
+_replica_reads = ContextVar('replica_reads', default=False)
+
+
+def replica_configured():
+    return REPLICA in settings.DATABASES
+
+
+def pin_key(user_id):
+    return f"replica_pin_{user_id}"
+
+
+def pin_to_primary(user):
+    """Read this user's data from the primary until the replica has caught up."""
+    cache.set(pin_key(user.pk), True, timeout=settings.REPLICA_PIN_SECONDS)
+
+
+def is_pinned(user):
+    return cache.get(pin_key(user.pk)) is not None
+
+
+@contextmanager
+def replica_reads(user=None):
+    """
+    Send the reads in this block to the replica, unless the user wrote
+    recently and could otherwise miss their own changes. Not for reads
+    that fill a shared cache: the cache could keep what a lagging replica
+    returned after the write that invalidated it.
+    """
+    enabled = replica_configured() and not (
+        user is not None and user.is_authenticated and is_pinned(user)
+    )
+    token = _replica_reads.set(enabled)
+    try:
+        yield
+    finally:
+        _replica_reads.reset(token)
+
+
+def reads_from_replica(view):
+    """Function view decorator; goes under @api_view so request.user is set."""
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        with replica_reads(request.user):
+            return view(request, *args, **kwargs)
+    return wrapper
+
+
+class ReplicaListMixin:
+    """Serves a viewset's list action from the replica."""
+
+    def list(self, request, *args, **kwargs):
+        with replica_reads(request.user):
+            return super().list(request, *args, **kwargs)
+
+
+class ReplicaRouter:
+    """
+    Reads go to the primary unless code opts in with replica_reads(), so
+    checkout and every other read-then-write path keep seeing their own
+    writes. Reads inside a transaction always stay on the primary.
+    """
+
+    def db_for_read(self, model, **hints):
+        if _replica_reads.get() and not connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return REPLICA
+        return None
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Both aliases hold the same data
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db != REPLICA
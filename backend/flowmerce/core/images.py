@@ -0,0 +1,124 @@
+import io
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import close_old_connections, transaction
+from PIL import Image, ImageOps
+
+from .catalog import invalidate_products
+from .models import Product
+
+logger = logging.getLogger(__name__)
+
+# name -> longest edge in pixels
+VARIANTS = {
+    'thumb': 160,
+    'medium': 640,
+}
+VARIANT_DIRECTORY = 'variants'
+
+_executor = None
+_executor_lock = threading.Lock()
+_scheduled = set()
+
+
+def render_variant(image, size):
+    copy = image.copy()
+    copy.thumbnail((size, size), Image.Resampling.LANCZOS)
+    buffer = io.BytesIO()
+    copy.save(buffer, 'WEBP', quality=settings.IMAGE_VARIANT_QUALITY, method=4)
+    return buffer.getvalue()
+
+
+def existing_variants(source):
+    # Deduplicated uploads share a source file, so reuse its variants
+    for variants in Product.objects.filter(image=source).order_by().values_list('image_variants', flat=True):
+        if variants.get('source') == source and all(variant in variants for variant in VARIANTS):
+            return variants
+    return None
+
+
+def build_variants(source, storage=default_storage):
+    """
+    Write the WebP variants of a stored image and return their stored names
+    keyed by variant, plus the source they were made from.
+    """
+    variants = existing_variants(source)
+    if variants is not None:
+        return variants
+
+    variants = {'source': source}
+    stem = os.path.splitext(os.path.basename(source))[0]
+    with storage.open(source, 'rb') as handle:
+        image = ImageOps.exif_transpose(Image.open(handle))
+        if image.mode not in ('RGB', 'RGBA'):
+            image = image.convert('RGBA' if 'transparency' in image.info else 'RGB')
+        for variant, size in VARIANTS.items():
+            variants[variant] = storage.save(
+                f"{VARIANT_DIRECTORY}/{variant}/{stem}.webp",
+                ContentFile(render_variant(image, size)),
+            )
+
+    return variants
+
+
+def process_product_image(product_id, source):
+    try:
+        variants = build_variants(source)
+        # Skip if the image was replaced while this one was processed
+        product = Product.objects.filter(pk=product_id, image=source)
+        if product.update(image_variants=variants):
+            invalidate_products(product.values_list('owner_id', flat=True).first())
+    except Exception:
+        logger.exception(f"Building image variants for product {product_id} failed")
+    finally:
+        _scheduled.discard((product_id, source))
+        close_old_connections()
+
+
+def get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.IMAGE_VARIANT_WORKERS,
+                thread_name_prefix='image-variants',
+            )
+        return _executor
+
+
+def needs_variants(product):
+    return bool(product.image) and product.image_variants.get('source') != product.image.name
+
+
+def schedule_variants(product):
+    """
+    Render the product's image variants on the worker pool once the current
+    transaction commits, off the request thread.
+    """
+    key = (product.pk, product.image.name)
+
+    def submit():
+        # A product saved twice in one request is only processed once
+        if key in _scheduled:
+            return
+        _scheduled.add(key)
+        get_executor().submit(process_product_image, *key)
+
+    transaction.on_commit(submit)
+
+
+def variant_urls(product, storage=default_storage):
+    """URLs of the product's ready variants; empty while they are being made."""
+    if not needs_variants(product) and product.image:
+        return {
+            variant: storage.url(name)
+            for variant, name in product.image_variants.items()
+            if variant in VARIANTS
+        }
+    return {}
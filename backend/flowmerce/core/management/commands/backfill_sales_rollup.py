@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+
+from core.models import User
+from core.rollups import backfill
+
+
+class Command(BaseCommand):
+    help = "Rebuild the daily sales rollup from the order table."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--user',
+            action='append',
+            dest='emails',
+            help="Only rebuild rows for this user's email (repeatable)",
+        )
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        employees = None
+        if options['emails']:
+            employees = User.objects.filter(email__in=options['emails'])
+
+        written = backfill(employees=employees, batch_size=options['batch_size'])
+
+        self.stdout.write(self.style.SUCCESS(f"Wrote {written} rollup rows"))
@@ -0,0 +1,81 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from core.benchmarks import SCENARIOS, dump_report, run_benchmarks
+from core.models import Subscription
+from core.seeding import delete_seeded, seed_tenants, seeded_users
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark the core API hot paths against synthetic tenants and print "
+        "a JSON report of throughput, latency and query counts, plus "
+        "microbenchmarks of individual hot spots."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tenants', type=int, default=5)
+        parser.add_argument('--products', type=int, default=50, help="Products per tenant")
+        parser.add_argument('--orders', type=int, default=200, help="Orders per tenant")
+        parser.add_argument('--items', type=int, default=3, help="Items per order")
+        parser.add_argument(
+            '--expired',
+            type=int,
+            default=1,
+            help="Extra tenants with an expired subscription, for the subscription gate",
+        )
+        parser.add_argument('--iterations', type=int, default=50)
+        parser.add_argument(
+            '--scenario',
+            action='append',
+            choices=sorted(SCENARIOS),
+            help="Only run these scenarios (repeatable)",
+        )
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument(
+            '--reseed',
+            action='store_true',
+            help="Delete and recreate the synthetic tenants for this dataset size",
+        )
+        parser.add_argument('--output', help="Also write the report to this file")
+
+    def handle(self, *args, **options):
+        if options['tenants'] < 1 or options['iterations'] < 1:
+            raise CommandError("--tenants and --iterations must be at least 1")
+
+        dataset = {
+            'tenants': options['tenants'],
+            'products': options['products'],
+            'orders': options['orders'],
+            'items': options['items'],
+            'expired': options['expired'],
+            'seed': options['seed'],
+        }
+        # Same sizes, same tenants: runs on different commits see identical data
+        prefix = "bench-t{tenants}-p{products}-o{orders}-i{items}-e{expired}-s{seed}-".format(**dataset)
+
+        if options['reseed']:
+            delete_seeded(prefix)
+        if not seeded_users(prefix).exists():
+            self.stderr.write(f"Seeding tenants under {prefix}...")
+            seed_tenants(
+                prefix,
+                options['tenants'] + options['expired'],
+                products=options['products'],
+                orders=options['orders'],
+                items_per_order=options['items'],
+                expired=options['expired'],
+                seed=options['seed'],
+            )
+
+        users = list(seeded_users(prefix).select_related('subscription'))
+        active = [u for u in users if u.subscription.status != Subscription.EXPIRED]
+        expired = [u for u in users if u.subscription.status == Subscription.EXPIRED]
+
+        report = run_benchmarks(
+            active,
+            expired,
+            [name for name in SCENARIOS if name in (options['scenario'] or SCENARIOS)],
+            options['iterations'],
+            dataset,
+        )
+        self.stdout.write(dump_report(report, options['output']))
@@ -0,0 +1,74 @@
+import json
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from django.core.management.base import BaseCommand
+
+
+class FakeOllamaHandler(BaseHTTPRequestHandler):
+    """Answers /api/generate with a canned NDJSON stream like Ollama's."""
+
+    protocol_version = 'HTTP/1.1'
+    reply = "Sales are steady this month. Keep your top products in stock."
+    delay = 0.0
+    # False drops the connection before the final "done" frame
+    complete = True
+
+    def do_POST(self):
+        if self.path != '/api/generate':
+            self.send_error(404)
+            return
+
+        length = int(self.headers.get('Content-Length') or 0)
+        try:
+            payload = json.loads(self.rfile.read(length) or b'{}')
+        except ValueError:
+            self.send_error(400)
+            return
+
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/x-ndjson')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+
+        for word in self.reply.split(' '):
+            self._write_line({'model': payload.get('model'), 'response': word + ' ', 'done': False})
+            if self.delay:
+                time.sleep(self.delay)
+        if self.complete:
+            self._write_line({'model': payload.get('model'), 'response': '', 'done': True})
+        self.wfile.write(b'0\r\n\r\n')
+
+    def _write_line(self, data):
+        chunk = json.dumps(data).encode() + b'\n'
+        self.wfile.write(f'{len(chunk):x}\r\n'.encode() + chunk + b'\r\n')
+        self.wfile.flush()
+
+    def log_message(self, format, *args):
+        pass
+
+
+class Command(BaseCommand):
+    help = "Run a fake Ollama server for exercising the assistant endpoints locally."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--port', type=int, default=11434)
+        parser.add_argument(
+            '--delay',
+            type=float,
+            default=0.0,
+            help="Seconds to wait between streamed tokens",
+        )
+
+    def handle(self, *args, **options):
+        FakeOllamaHandler.delay = options['delay']
+        server = ThreadingHTTPServer(('127.0.0.1', options['port']), FakeOllamaHandler)
+        server.daemon_threads = True
+
+        self.stdout.write(f"Fake Ollama listening on http://127.0.0.1:{options['port']}")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
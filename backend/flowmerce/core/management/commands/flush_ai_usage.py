@@ -0,0 +1,42 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from core.metering import flush_usage, reconcile_usage
+
+
+class Command(BaseCommand):
+    help = (
+        "Write pending AI request counts from the cache to subscriptions. "
+        "Use --loop to flush periodically, --reconcile to check every "
+        "subscription's counters against the database."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--loop',
+            action='store_true',
+            help="Keep flushing every --interval seconds",
+        )
+        parser.add_argument('--interval', type=float, default=30)
+        parser.add_argument(
+            '--reconcile',
+            action='store_true',
+            help="Flush every subscription and refresh cached request counts that "
+                 "differ from the database",
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            if options['reconcile']:
+                corrections = reconcile_usage()
+                for pk, seen, stored in corrections:
+                    self.stdout.write(f"Subscription {pk}: counters had {seen}, database has {stored}")
+                self.stdout.write(f"Reconciled {len(corrections)} subscriptions")
+            else:
+                flushed = flush_usage()
+                self.stdout.write(f"Flushed {flushed} AI requests")
+
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
@@ -0,0 +1,27 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+
+from core.images import needs_variants, process_product_image
+from core.models import Product
+
+
+class Command(BaseCommand):
+    help = "Generate missing WebP variants for product images, e.g. for images uploaded before variants existed."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=4)
+
+    def handle(self, *args, **options):
+        products = Product.objects.exclude(Q(image='') | Q(image__isnull=True)).only('id', 'image', 'image_variants')
+        pending = [
+            (product.pk, product.image.name)
+            for product in products.iterator()
+            if needs_variants(product)
+        ]
+
+        with ThreadPoolExecutor(max_workers=options['workers']) as pool:
+            list(pool.map(lambda job: process_product_image(*job), pending))
+
+        self.stdout.write(self.style.SUCCESS(f"Processed {len(pending)} product images"))
@@ -0,0 +1,78 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.seeding import delete_seeded, seed_tenants, seeded_users
+
+DEFAULT_PREFIX = 'load-'
+
+
+class Command(BaseCommand):
+    help = (
+        "Generate synthetic tenants with products, tags, orders and "
+        "subscriptions for load testing. Uses chunked bulk inserts and skips "
+        "model signals."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--prefix',
+            help=f"Email and slug prefix of the generated rows (default {DEFAULT_PREFIX!r})",
+        )
+        parser.add_argument('--tenants', type=int, default=100)
+        parser.add_argument('--products', type=int, default=200, help="Products per tenant")
+        parser.add_argument('--orders', type=int, default=1000, help="Orders per tenant")
+        parser.add_argument('--items', type=int, default=3, help="Items per order")
+        parser.add_argument('--categories', type=int, default=20)
+        parser.add_argument('--tags', type=int, default=50)
+        parser.add_argument('--tags-per-product', type=int, default=2)
+        parser.add_argument('--months', type=int, default=12, help="Spread orders over this many months")
+        parser.add_argument('--expired', type=int, default=0, help="Tenants with an expired subscription")
+        parser.add_argument('--chunk-size', type=int, default=5000)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument(
+            '--replace',
+            action='store_true',
+            help="Delete tenants previously generated with this prefix first; needs an explicit --prefix",
+        )
+
+    def handle(self, *args, **options):
+        if options['tenants'] < 1 or options['chunk_size'] < 1:
+            raise CommandError("--tenants and --chunk-size must be at least 1")
+        if options['expired'] > options['tenants']:
+            raise CommandError("--expired cannot exceed --tenants")
+
+        if options['replace'] and options['prefix'] is None:
+            raise CommandError("--replace deletes data; pass the --prefix to delete explicitly")
+
+        prefix = options['prefix'] or DEFAULT_PREFIX
+        existing = seeded_users(prefix)
+        if existing.exists():
+            if not options['replace']:
+                raise CommandError(
+                    f"Tenants with prefix {prefix!r} already exist; use --replace or another --prefix"
+                )
+            self.stdout.write(f"Deleting existing {prefix!r} tenants...")
+            delete_seeded(prefix)
+
+        started = time.monotonic()
+        created = seed_tenants(
+            prefix,
+            options['tenants'],
+            products=options['products'],
+            orders=options['orders'],
+            items_per_order=options['items'],
+            categories=options['categories'],
+            tags=options['tags'],
+            tags_per_product=options['tags_per_product'],
+            months=options['months'],
+            expired=options['expired'],
+            seed=options['seed'],
+            chunk_size=options['chunk_size'],
+            progress=self.stdout.write,
+        )
+
+        summary = ", ".join(f"{count} {name}" for name, count in created.items())
+        self.stdout.write(self.style.SUCCESS(
+            f"Created {summary} in {time.monotonic() - started:.1f}s"
+        ))
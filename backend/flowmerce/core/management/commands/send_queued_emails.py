@@ -0,0 +1,42 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from core.outbox import deliver_pending
+
+
+class Command(BaseCommand):
+    help = "Deliver emails queued in the outbox. Use --loop to keep running as a worker."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=50)
+        parser.add_argument('--max-attempts', type=int, default=5)
+        parser.add_argument(
+            '--loop',
+            action='store_true',
+            help="Keep polling the outbox instead of exiting once it is empty",
+        )
+        parser.add_argument(
+            '--interval',
+            type=float,
+            default=5,
+            help="Seconds to sleep between polls when the outbox is empty",
+        )
+
+    def handle(self, *args, **options):
+        total = 0
+
+        while True:
+            sent = deliver_pending(
+                batch_size=options['batch_size'],
+                max_attempts=options['max_attempts'],
+            )
+            total += sent
+
+            if sent:
+                continue
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
+
+        self.stdout.write(self.style.SUCCESS(f"Processed {total} queued emails"))
@@ -0,0 +1,173 @@
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, When
+
+from .models import Subscription
+from .subscriptions import get_subscription_state, invalidate_subscription_state, states
+
+# Only this plan has a request quota; premium is unlimited, basic has no AI
+METERED_PLAN = 'pro'
+
+# Caches each worker process keeps to itself
+PER_PROCESS_BACKENDS = (LocMemCache, DummyCache)
+
+
+def counters_shared():
+    # Pending counts must be seen by every worker and by flush_ai_usage
+    return not isinstance(caches['default'], PER_PROCESS_BACKENDS)
+
+
+def pending_key(subscription_id):
+    return f"ai_usage_pending_{subscription_id}"
+
+
+def flush_lock_key(subscription_id):
+    return f"ai_usage_flush_lock_{subscription_id}"
+
+
+def record_ai_request(user):
+    """
+    Count one assistant request against the user's quota with an atomic
+    cache increment. flush_usage() later moves the counts to the database,
+    either from the flush_ai_usage worker or inline once a subscription has
+    AI_USAGE_FLUSH_THRESHOLD requests pending, which also bounds what a
+    lost cache can take with it.
+
+    With a per-process cache the count is written to the database at once
+    instead, since no other process could see or flush it.
+    """
+    state = get_subscription_state(user)
+    if state is None or state.plan_code != METERED_PLAN:
+        return
+
+    if not counters_shared():
+        Subscription.objects.filter(pk=state.id).update(ai_requests_used=F('ai_requests_used') + 1)
+        invalidate_subscription_state(state.user_id)
+        return
+
+    key = pending_key(state.id)
+    cache.add(key, 0, timeout=None)
+    try:
+        pending = cache.incr(key)
+    except ValueError:
+        # Evicted between add and incr
+        cache.add(key, 1, timeout=None)
+        pending = 1
+
+    # Bounds how much is held only in the cache when no flush worker runs
+    if pending >= settings.AI_USAGE_FLUSH_THRESHOLD:
+        flush_usage([state.id])
+
+
+def pending_usage(subscription_id):
+    return cache.get(pending_key(subscription_id)) or 0
+
+
+def ai_requests_used(state):
+    """Requests used so far: persisted count plus the not yet flushed ones."""
+    return state.ai_requests_used + pending_usage(state.id)
+
+
+def flush_usage(subscription_ids=None):
+    """
+    Move pending request counts from the cache into
+    Subscription.ai_requests_used with a single F() update.
+
+    Only metered-plan subscriptions are checked unless subscription_ids is
+    given. Returns the number of requests flushed.
+    """
+    if subscription_ids is None:
+        subscription_ids = Subscription.objects.filter(
+            plan__code__iexact=METERED_PLAN
+        ).values_list('id', flat=True)
+
+    candidates = [
+        pk for pk, count in _pending_counts(subscription_ids).items() if count
+    ]
+
+    # Only one flusher per subscription, or two could move the same count
+    locked = [pk for pk in candidates if cache.add(flush_lock_key(pk), 1, timeout=60)]
+    if not locked:
+        return 0
+
+    try:
+        counts = {pk: count for pk, count in _pending_counts(locked).items() if count}
+        if not counts:
+            _release(locked)
+            return 0
+
+        with transaction.atomic():
+            Subscription.objects.filter(pk__in=counts).update(
+                ai_requests_used=Case(
+                    *[
+                        When(pk=pk, then=F('ai_requests_used') + count)
+                        for pk, count in counts.items()
+                    ],
+                    default=F('ai_requests_used'),
+                    output_field=IntegerField(),
+                )
+            )
+            owners = dict(
+                Subscription.objects.filter(pk__in=counts).values_list('pk', 'user_id')
+            )
+
+            def settle():
+                # Subtract exactly what was flushed; requests counted meanwhile stay pending
+                for pk, count in counts.items():
+                    try:
+                        cache.decr(pending_key(pk), count)
+                    except ValueError:
+                        pass
+                    if pk in owners:
+                        invalidate_subscription_state(owners[pk])
+                _release(locked)
+
+            transaction.on_commit(settle)
+    except Exception:
+        _release(locked)
+        raise
+
+    return sum(counts.values())
+
+
+def reconcile_usage(batch_size=500):
+    """
+    Flush every pending counter, then compare the request count the quota
+    checks see for each subscription with its total in the database.
+    Cached states holding a different total are refreshed, and counters
+    that went negative are dropped. Returns the corrections made, as
+    (subscription id, what was seen, what the database has) tuples.
+    """
+    corrections = []
+    subscriptions = Subscription.objects.order_by('pk').values_list('pk', 'user_id', 'ai_requests_used')
+
+    for start in range(0, subscriptions.count(), batch_size):
+        batch = list(subscriptions[start:start + batch_size])
+        ids = [pk for pk, _, _ in batch]
+
+        for pk, count in _pending_counts(ids).items():
+            if count < 0:
+                cache.delete(pending_key(pk))
+                corrections.append((pk, count, 0))
+        flush_usage(ids)
+
+        stored = dict(Subscription.objects.filter(pk__in=ids).values_list('pk', 'ai_requests_used'))
+        for pk, user_id, _ in batch:
+            state = states.get(user_id)
+            if state is not None and state.ai_requests_used != stored[pk]:
+                states.bump(user_id)
+                corrections.append((pk, state.ai_requests_used, stored[pk]))
+
+    return corrections
+
+
+def _pending_counts(subscription_ids):
+    keys = {pending_key(pk): pk for pk in subscription_ids}
+    return {keys[key]: count for key, count in cache.get_many(list(keys)).items()}
+
+
+def _release(subscription_ids):
+    cache.delete_many([flush_lock_key(pk) for pk in subscription_ids])
@@ -0,0 +1,153 @@
+import math
+import threading
+import time
+from collections import defaultdict, deque
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+
+
+class QueryRecorder:
+    """connection.execute_wrapper hook counting queries and SQL time."""
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - start
+            self.count += 1
+
+
+def percentile(sorted_values, pct):
+    # Nearest-rank percentile
+    if not sorted_values:
+        return None
+    rank = max(math.ceil(pct / 100 * len(sorted_values)), 1)
+    return round(sorted_values[rank - 1], 2)
+
+
+class RouteMetrics:
+    """
+    In-process store of recent request samples per route, bounded to the
+    last REQUEST_METRICS_SAMPLES requests of each route.
+    """
+
+    FIELDS = ('total_ms', 'view_ms', 'db_ms', 'queries', 'response_bytes')
+
+    def __init__(self, max_samples):
+        self.max_samples = max_samples
+        self._lock = threading.Lock()
+        self._samples = defaultdict(lambda: deque(maxlen=self.max_samples))
+        self._counts = defaultdict(int)
+
+    def record(self, route, sample):
+        with self._lock:
+            self._samples[route].append(sample)
+            self._counts[route] += 1
+
+    def summary(self):
+        with self._lock:
+            snapshot = {route: list(samples) for route, samples in self._samples.items()}
+            counts = dict(self._counts)
+
+        result = {}
+        for route, samples in snapshot.items():
+            route_summary = {'requests': counts[route], 'sampled': len(samples)}
+            for field in self.FIELDS:
+                values = sorted(s[field] for s in samples if s[field] is not None)
+                route_summary[field] = {
+                    'p50': percentile(values, 50),
+                    'p95': percentile(values, 95),
+                    'p99': percentile(values, 99),
+                }
+            result[route] = route_summary
+        return result
+
+    def reset(self):
+        with self._lock:
+            self._samples.clear()
+            self._counts.clear()
+
+
+route_metrics = RouteMetrics(getattr(settings, 'REQUEST_METRICS_SAMPLES', 1000))
+
+
+class RequestMetricsMiddleware:
+    """
+    Records query count, SQL time, view time and response size for every
+    request, adds them as a Server-Timing header and aggregates them per
+    resolved view. Enabled with REQUEST_METRICS_ENABLED.
+
+    Listed first so the totals cover every other middleware; the view time
+    comes from ViewTimingMiddleware, listed last.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not settings.REQUEST_METRICS_ENABLED:
+            return self.get_response(request)
+
+        recorder = QueryRecorder()
+        start = time.perf_counter()
+        with ExitStack() as stack:
+            for alias in connections:
+                stack.enter_context(connections[alias].execute_wrapper(recorder))
+            response = self.get_response(request)
+        total = time.perf_counter() - start
+
+        view_time = getattr(request, '_metrics_view_time', None)
+        size = None if response.streaming else len(response.content)
+
+        route_metrics.record(self.route_name(request), {
+            'total_ms': total * 1000,
+            'view_ms': view_time * 1000 if view_time is not None else None,
+            'db_ms': recorder.duration * 1000,
+            'queries': recorder.count,
+            'response_bytes': size,
+        })
+
+        timings = [
+            f'db;dur={recorder.duration * 1000:.1f};desc="{recorder.count} queries"',
+            f'total;dur={total * 1000:.1f}',
+        ]
+        if view_time is not None:
+            timings.insert(1, f'view;dur={view_time * 1000:.1f}')
+        response['Server-Timing'] = ', '.join(timings)
+
+        return response
+
+    def route_name(self, request):
+        match = getattr(request, 'resolver_match', None)
+        view = match.view_name if match else 'unresolved'
+        return f"{request.method} {view}"
+
+
+class ViewTimingMiddleware:
+    """
+    Times the view alone for RequestMetricsMiddleware: as the innermost
+    middleware its process_view runs after every other one, and nothing but
+    the view runs before its get_response returns.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        start = getattr(request, '_metrics_view_start', None)
+        if start is not None:
+            request._metrics_view_time = time.perf_counter() - start
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if settings.REQUEST_METRICS_ENABLED:
+            request._metrics_view_start = time.perf_counter()
+        return None
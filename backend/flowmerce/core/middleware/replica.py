@@ -0,0 +1,28 @@
+from core.db_routers import pin_to_primary, replica_configured
+
+SAFE_METHODS = frozenset(['GET', 'HEAD', 'OPTIONS', 'TRACE'])
+
+
+class ReadYourWritesMiddleware:
+    """
+    Pins a user to the primary for REPLICA_PIN_SECONDS after any request
+    that may have written, so their next reads don't come from a replica
+    that is still behind.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+
+        # DRF authenticates inside the view and sets request.user then
+        user = getattr(request, 'user', None)
+        if (
+            request.method not in SAFE_METHODS
+            and user is not None
+            and user.is_authenticated
+            and replica_configured()
+        ):
+            pin_to_primary(user)
+        return response
@@ -1,17 +1,16 @@
 from django.http import JsonResponse
-from django.utils import timezone
-from django.urls import resolve
 
 from core.models import Subscription
+from core.subscriptions import subscription_state_for, transition_status
 
 
-WHITELISTED_URL_NAMES = [
+WHITELISTED_URL_NAMES = frozenset([
     'login',
     'register',
     'payment-initiate',
     'payment-callback',
     'payment-request',
-]
+])
 
 
 class SubscriptionMiddleware:
@@ -19,26 +18,24 @@ class SubscriptionMiddleware:
         self.get_response = get_response
 
     def __call__(self, request):
+        return self.get_response(request)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
         # Skip unauthenticated users
         if not request.user.is_authenticated:
-            return self.get_response(request)
+            return None
 
         # 🔑 Admin / staff bypass
         if request.user.is_superuser or request.user.is_staff:
-            return self.get_response(request)
-
-        # Skip whitelisted routes
-        try:
-            resolved = resolve(request.path)
-            if resolved.url_name in WHITELISTED_URL_NAMES:
-                return self.get_response(request)
-        except Exception:
-            pass
-
-        # Check subscription exists
-        try:
-            subscription = request.user.subscription
-        except Subscription.DoesNotExist:
+            return None
+
+        # Skip whitelisted routes; Django has already resolved the URL by now
+        if request.resolver_match.url_name in WHITELISTED_URL_NAMES:
+            return None
+
+        # Cached snapshot; no queries on a warm path
+        subscription = subscription_state_for(request)
+        if subscription is None:
             return self._blocked_response(
                 "No active subscription. Please subscribe to continue."
             )
@@ -51,20 +48,16 @@ class SubscriptionMiddleware:
 
         # 🔑 Check active status
         if not subscription.is_active():
-            subscription.status = Subscription.EXPIRED
-            subscription.save(update_fields=['status'])
+            transition_status(subscription, Subscription.EXPIRED)
             return self._blocked_response(
                 "Your subscription has expired. Please renew."
             )
 
-        now = timezone.now()
         days_remaining = subscription.days_remaining()
 
         # Last 5 days warning
         if days_remaining <= 5:
-            if subscription.status != Subscription.EXPIRING:
-                subscription.status = Subscription.EXPIRING
-                subscription.save(update_fields=['status'])
+            transition_status(subscription, Subscription.EXPIRING)
 
             # Attach info for frontend
             request.subscription_warning = True
@@ -75,7 +68,7 @@ class SubscriptionMiddleware:
         # Attach subscription globally (useful)
         request.subscription = subscription
 
-        return self.get_response(request)
+        return None
 
     def _blocked_response(self, message):
         return JsonResponse(
@@ -0,0 +1,41 @@
+# Generated by Django 5.2.2 on 2026-10-18 14:55
+
+from django.db import migrations, models
+from django.db.models import Max
+
+
+def seed_order_number_sequence(apps, schema_editor):
+    Order = apps.get_model("core", "Order")
+    NumberSequence = apps.get_model("core", "NumberSequence")
+
+    last_number = Order.objects.aggregate(last=Max("number"))["last"] or 999
+    NumberSequence.objects.update_or_create(
+        name="order_number", defaults={"last_value": last_number}
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0010_subscription_ai_request_limit_and_more"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="NumberSequence",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("name", models.CharField(max_length=50, unique=True)),
+                ("last_value", models.BigIntegerField(default=0)),
+            ],
+        ),
+        migrations.RunPython(seed_order_number_sequence, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,71 @@
+# Generated by Django 5.2.2 on 2026-10-18 14:59
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Q, Sum
+from django.db.models.functions import TruncDate
+
+
+def backfill_rollups(apps, schema_editor):
+    Order = apps.get_model("core", "Order")
+    DailySalesRollup = apps.get_model("core", "DailySalesRollup")
+
+    rows = (
+        Order.objects.annotate(day=TruncDate("created_at"))
+        .values("employee_id", "day")
+        .annotate(
+            revenue=Sum("amount"),
+            order_count=Count("id"),
+            pending_count=Count("id", filter=Q(status="Pending")),
+            completed_count=Count("id", filter=Q(status="Completed")),
+            cancelled_count=Count("id", filter=Q(status="Cancelled")),
+        )
+        .order_by()
+    )
+    DailySalesRollup.objects.bulk_create(
+        [DailySalesRollup(**row) for row in rows], batch_size=1000
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0012_outboundemail"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="DailySalesRollup",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("day", models.DateField()),
+                ("revenue", models.BigIntegerField(default=0)),
+                ("order_count", models.IntegerField(default=0)),
+                ("pending_count", models.IntegerField(default=0)),
+                ("completed_count", models.IntegerField(default=0)),
+                ("cancelled_count", models.IntegerField(default=0)),
+                (
+                    "employee",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="sales_rollups",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+            options={
+                "ordering": ["day"],
+                "unique_together": {("employee", "day")},
+            },
+        ),
+        migrations.RunPython(backfill_rollups, migrations.RunPython.noop),
+    ]
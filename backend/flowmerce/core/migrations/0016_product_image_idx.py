@@ -0,0 +1,17 @@
+# Generated by Django 5.2.2 on 2026-10-18 18:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0015_product_image_variants"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="product",
+            index=models.Index(fields=["image"], name="product_image_idx"),
+        ),
+    ]
@@ -76,6 +76,8 @@ class Product(models.Model):
     )
 
     image = models.ImageField(upload_to='products/', blank=True, null=True)
+    # Resized WebP copies of image, written by core.images off the request thread
+    image_variants = models.JSONField(default=dict, blank=True, editable=False)
     quantity = models.PositiveIntegerField(default=0)
     stock = models.PositiveIntegerField(default=0)
 
@@ -101,6 +103,13 @@ class Product(models.Model):
         verbose_name = 'Product'
         verbose_name_plural = 'Products'
         unique_together = ('owner', 'sku')  # 🔥 SaaS-safe SKU
+        # Every product listing is scoped to its owner
+        indexes = [
+            models.Index(fields=['owner', 'created_at'], name='product_owner_created_idx'),
+            models.Index(fields=['owner', 'status'], name='product_owner_status_idx'),
+            # Products sharing a content-addressed image reuse its variants
+            models.Index(fields=['image'], name='product_image_idx'),
+        ]
 
     def __str__(self):
         return f"{self.title} ({self.owner.email if self.owner else 'No Owner'})"
@@ -156,17 +165,65 @@ class Order(models.Model):
         ordering = ['-created_at']
         verbose_name = 'Order'
         verbose_name_plural = 'Orders'
+        # Every order query is scoped to its employee
+        indexes = [
+            models.Index(fields=['employee', 'created_at'], name='order_employee_created_idx'),
+            models.Index(fields=['employee', 'status'], name='order_employee_status_idx'),
+        ]
 
     def __str__(self):
         return f"Order {self.number} ({self.employee.email})"
 
     def save(self, *args, **kwargs):
         if not self.number:
-            last_order = Order.objects.order_by('-number').first()
-            self.number = (last_order.number + 1) if last_order and last_order.number else 1000
+            from .sequences import order_numbers
+            self.number = order_numbers.allocate(using=kwargs.get('using'))
         super().save(*args, **kwargs)
 
 
+class NumberSequence(models.Model):
+    """
+    Counter row backing a block allocator in core.sequences. Workers reserve
+    ranges by bumping last_value instead of scanning the numbered table.
+    """
+    name = models.CharField(max_length=50, unique=True)
+    last_value = models.BigIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.name} ({self.last_value})"
+
+class DailySalesRollup(models.Model):
+    """
+    Per-employee daily order totals, kept in step with Order writes by
+    core.rollups so sales reports never scan the raw order table.
+    """
+    employee = models.ForeignKey(
+        User,
+        related_name='sales_rollups',
+        on_delete=models.CASCADE
+    )
+    day = models.DateField()
+
+    revenue = models.BigIntegerField(default=0)
+    order_count = models.IntegerField(default=0)
+
+    pending_count = models.IntegerField(default=0)
+    completed_count = models.IntegerField(default=0)
+    cancelled_count = models.IntegerField(default=0)
+
+    STATUS_FIELDS = {
+        Order.PENDING: 'pending_count',
+        Order.COMPLETED: 'completed_count',
+        Order.CANCELLED: 'cancelled_count',
+    }
+
+    class Meta:
+        ordering = ['day']
+        unique_together = ('employee', 'day')
+
+    def __str__(self):
+        return f"{self.employee_id} {self.day}: {self.order_count} orders"
+
   
                
     
@@ -253,6 +310,9 @@ class Subscription(models.Model):
     EXPIRED = 'expired'
     CANCELLED = 'cancelled'
 
+    # Expiring subscriptions are still usable until end_date passes
+    ACTIVE_STATUSES = (ACTIVE, EXPIRING)
+
     STATUS_CHOICES = [
         ('pending', 'Pending'),
         ('active', 'Active'),
@@ -298,7 +358,7 @@ class Subscription(models.Model):
     
     
     def is_active(self):
-        return self.status == self.ACTIVE and self.end_date and self.end_date > timezone.now()
+        return self.status in self.ACTIVE_STATUSES and self.end_date and self.end_date > timezone.now()
 
     def activate(self):
         self.status = 'active'
@@ -520,3 +580,45 @@ class PaymentRequest(models.Model):
         self.reviewed_by = admin_user
         self.reviewed_at = timezone.now()
         self.save(update_fields=['status', 'reviewed_by', 'reviewed_at'])
+
+
+class OutboundEmail(models.Model):
+    PENDING = 'pending'
+    SENDING = 'sending'
+    SENT = 'sent'
+    FAILED = 'failed'
+
+    STATUS_CHOICES = [
+        (PENDING, 'Pending'),
+        (SENDING, 'Sending'),
+        (SENT, 'Sent'),
+        (FAILED, 'Failed'),
+    ]
+
+    subject = models.CharField(max_length=255)
+    body = models.TextField()
+    from_email = models.CharField(max_length=255)
+    recipient = models.EmailField()
+
+    status = models.CharField(
+        max_length=20,
+        choices=STATUS_CHOICES,
+        default=PENDING
+    )
+
+    attempts = models.PositiveIntegerField(default=0)
+    last_error = models.TextField(blank=True)
+    # While sending: when the claim lapses and another worker may retry
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['created_at']
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.recipient} - {self.subject} ({self.status})"
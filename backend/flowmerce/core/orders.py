@@ -0,0 +1,48 @@
+from django.db import transaction
+
+from .models import Order, OrderItem
+from .stock import reserve_stock
+
+
+def build_order_items(items_data):
+    """
+    Turn validated line items (with resolved Product instances) into unsaved
+    OrderItem rows carrying the product snapshot fields.
+    """
+    items = []
+    for item_data in items_data:
+        product = item_data['product']
+        items.append(OrderItem(
+            product=product,
+            quantity=item_data['quantity'],
+            price=product.price,
+            product_title=product.title,
+            product_price=product.price,
+            product_sku=product.sku,
+        ))
+    return items
+
+
+@transaction.atomic
+def create_order(employee, items_data, **fields):
+    """
+    Create an order and all of its line items in a fixed number of queries:
+    one insert for the order, one bulk insert for the items and a single
+    stock update. The total is computed in memory from the snapshotted prices.
+    """
+    items = build_order_items(items_data)
+
+    order = Order.objects.create(
+        employee=employee,
+        amount=sum(item.total_price for item in items),
+        **fields
+    )
+
+    for item in items:
+        item.order = order
+    OrderItem.objects.bulk_create(items)
+
+    # Oversold lines are reported rather than failing the checkout
+    order.oversold = reserve_stock(items)
+
+    return order
@@ -0,0 +1,118 @@
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db import transaction
+from django.utils import timezone
+
+from .models import OutboundEmail
+
+logger = logging.getLogger(__name__)
+
+RETRY_BASE_SECONDS = 30
+# How long a claimed batch may take before other workers retry it
+CLAIM_TIMEOUT = timedelta(minutes=10)
+
+RESULT_FIELDS = ['status', 'attempts', 'last_error', 'next_attempt_at', 'sent_at']
+
+
+def enqueue_email(subject, body, recipients, from_email=None):
+    """
+    Store an email in the outbox instead of sending it inline. The
+    send_queued_emails command delivers it in the background.
+    """
+    return OutboundEmail.objects.bulk_create([
+        OutboundEmail(
+            subject=subject,
+            body=body,
+            from_email=from_email or settings.DEFAULT_FROM_EMAIL,
+            recipient=recipient,
+        )
+        for recipient in recipients
+    ])
+
+
+def claim_batch(batch_size, now):
+    """
+    Mark a batch of due emails as sending and commit, so other workers skip
+    them without row locks being held while they are sent. Claims left
+    behind by a worker that died expire after CLAIM_TIMEOUT.
+    """
+    with transaction.atomic():
+        batch = list(
+            OutboundEmail.objects.select_for_update(skip_locked=True)
+            .filter(
+                status__in=[OutboundEmail.PENDING, OutboundEmail.SENDING],
+                next_attempt_at__lte=now,
+            )
+            .order_by('next_attempt_at')[:batch_size]
+        )
+        OutboundEmail.objects.filter(pk__in=[email.pk for email in batch]).update(
+            status=OutboundEmail.SENDING,
+            next_attempt_at=now + CLAIM_TIMEOUT,
+        )
+    return batch
+
+
+def deliver_pending(batch_size=50, max_attempts=5):
+    """
+    Send one batch of due emails over a single backend connection.
+
+    The batch is claimed first and sent outside any transaction; each
+    result is saved as soon as it is known, so a failure later on never
+    sends an email twice. Failed sends are retried with exponential
+    backoff until max_attempts is reached.
+    Returns the number of emails processed.
+    """
+    now = timezone.now()
+    batch = claim_batch(batch_size, now)
+    if not batch:
+        return 0
+
+    connection = get_connection(fail_silently=False)
+    try:
+        connection.open()
+    except Exception as e:
+        logger.error(f"Email backend unavailable: {e}")
+        for email in batch:
+            _record_failure(email, e, now, max_attempts)
+        OutboundEmail.objects.bulk_update(batch, RESULT_FIELDS)
+        return len(batch)
+
+    try:
+        for email in batch:
+            message = EmailMessage(
+                email.subject,
+                email.body,
+                email.from_email,
+                [email.recipient],
+                connection=connection,
+            )
+            try:
+                message.send()
+            except Exception as e:
+                logger.warning(f"Sending email {email.pk} failed: {e}")
+                _record_failure(email, e, now, max_attempts)
+            else:
+                email.status = OutboundEmail.SENT
+                email.attempts += 1
+                email.sent_at = timezone.now()
+                email.last_error = ''
+            email.save(update_fields=RESULT_FIELDS)
+    finally:
+        connection.close()
+
+    return len(batch)
+
+
+def _record_failure(email, error, now, max_attempts):
+    email.attempts += 1
+    email.last_error = str(error)
+    if email.attempts >= max_attempts:
+        email.status = OutboundEmail.FAILED
+    else:
+        email.status = OutboundEmail.PENDING
+        email.next_attempt_at = now + timedelta(
+            seconds=RETRY_BASE_SECONDS * 2 ** (email.attempts - 1)
+        )
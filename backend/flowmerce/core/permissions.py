@@ -1,5 +1,7 @@
 from rest_framework import permissions
 from rest_framework.permissions import BasePermission
+from .subscriptions import subscription_state_for
+from .metering import ai_requests_used
 
 class IsAdminUser(permissions.BasePermission):
     """
@@ -28,10 +30,10 @@ class HasActiveSubscription(permissions.BasePermission):
     def has_permission(self, request, view):
         if request.user.is_staff or request.user.is_superuser:
             return True
-        try:
-            return request.user.subscription.is_active()
-        except Exception:
+        if not request.user.is_authenticated:
             return False
+        state = subscription_state_for(request)
+        return bool(state and state.is_active())
 
 class IsAdminUser(permissions.BasePermission):
     def has_permission(self, request, view):
@@ -53,15 +55,11 @@ class CanUseAI(BasePermission):
         if user.is_staff or user.is_superuser:
             return True
 
-        try:
-            sub = user.subscription
-        except:
+        sub = subscription_state_for(request)
+        if sub is None or not sub.is_active():
             return False
 
-        if not sub.is_active():
-            return False
-
-        plan_code = sub.plan.code.lower()
+        plan_code = sub.plan_code
 
         # BASIC → no AI
         if plan_code == "basic":
@@ -73,6 +71,6 @@ class CanUseAI(BasePermission):
 
         # PRO → limited usage
         if plan_code == "pro":
-            return sub.ai_requests_used < sub.ai_request_limit
+            return ai_requests_used(sub) < sub.ai_request_limit
 
         return False
\ No newline at end of file
@@ -0,0 +1,276 @@
+import csv
+import io
+import json
+
+from django.db import connection, transaction
+from django.utils.text import slugify
+
+from .analytics import invalidate_summary
+from .catalog import category_table, invalidate_products, tag_table
+from .models import Product
+from .serializers import ProductImportSerializer
+
+IMPORT_BATCH_SIZE = 500
+EXPORT_CHUNK_SIZE = 2000
+MAX_REPORTED_ERRORS = 100
+
+FORMATS = {
+    'csv': 'text/csv',
+    'jsonl': 'application/x-ndjson',
+}
+EXPORT_FIELDS = [
+    'sku', 'title', 'description', 'price', 'quantity', 'stock',
+    'status', 'category', 'tags', 'slug',
+]
+# Columns an import may change; owner, image and created_at are never touched
+UPSERT_FIELDS = {'title', 'slug', 'description', 'price', 'quantity', 'stock', 'status', 'category'}
+TAG_SEPARATOR = '|'
+
+
+def detect_format(upload, requested=None):
+    fmt = (requested or upload.name.rsplit('.', 1)[-1]).lower()
+    if fmt in ('ndjson', 'json'):
+        fmt = 'jsonl'
+    return fmt if fmt in FORMATS else None
+
+
+def read_rows(upload, fmt):
+    """
+    Yield (line number, row) pairs from an uploaded file, one line at a
+    time. Rows that cannot be parsed are yielded as a ValueError.
+    """
+    text = io.TextIOWrapper(upload.file, encoding='utf-8-sig', newline='')
+    try:
+        if fmt == 'csv':
+            reader = csv.DictReader(text)
+            for row in reader:
+                yield reader.line_num, clean_csv_row(row)
+        else:
+            for line_number, line in enumerate(text, start=1):
+                if not line.strip():
+                    continue
+                try:
+                    row = json.loads(line)
+                except ValueError as exc:
+                    yield line_number, ValueError(f"Invalid JSON: {exc}")
+                    continue
+                if not isinstance(row, dict):
+                    row = ValueError("Each line must be a JSON object")
+                yield line_number, row
+    finally:
+        # The upload owns the underlying file
+        text.detach()
+
+
+def clean_csv_row(row):
+    # Empty cells mean "not given"; an empty tags cell clears the tags
+    cleaned = {
+        key: value for key, value in row.items()
+        if key and value not in ('', None)
+    }
+    if 'tags' in row:
+        cleaned['tags'] = [tag for tag in (row['tags'] or '').split(TAG_SEPARATOR) if tag]
+    return cleaned
+
+
+def import_products(owner, upload, fmt, batch_size=IMPORT_BATCH_SIZE):
+    """
+    Create or update the owner's products from a CSV or JSON Lines upload,
+    matching on sku. Rows are validated with ProductSerializer rules and
+    written in batches, each with one upsert. When a batch repeats a sku
+    the last row wins and the earlier ones are counted as skipped. Returns
+    a summary with the line numbers and errors of rejected rows and of the
+    skipped duplicates.
+    """
+    report = {
+        'processed': 0, 'created': 0, 'updated': 0, 'failed': 0, 'skipped': 0,
+        'errors': [], 'duplicates': [],
+    }
+
+    batch = []
+    for line_number, row in read_rows(upload, fmt):
+        batch.append((line_number, row))
+        if len(batch) >= batch_size:
+            import_batch(owner, batch, report)
+            batch = []
+    if batch:
+        import_batch(owner, batch, report)
+
+    if report['created'] or report['updated']:
+        invalidate_summary(owner.id)
+        invalidate_products(owner.id)
+    report['errors'].sort(key=lambda error: error['line'])
+    report['duplicates'].sort(key=lambda duplicate: duplicate['line'])
+    return report
+
+
+def import_batch(owner, batch, report):
+    report['processed'] += len(batch)
+
+    skus = {sku_of(row) for _, row in batch} - {None}
+    existing = {
+        row['sku']: row
+        for row in Product.objects.filter(owner=owner, sku__in=skus).values('sku', *UPSERT_FIELDS)
+    }
+
+    valid = {}
+    for line_number, row in batch:
+        if isinstance(row, Exception):
+            reject(report, line_number, {'non_field_errors': [str(row)]})
+            continue
+        if sku_of(row) is None:
+            reject(report, line_number, {'sku': ['This field is required.']})
+            continue
+
+        # Known skus are updates, which only need the columns they change
+        serializer = ProductImportSerializer(data=row, partial=sku_of(row) in existing)
+        if serializer.is_valid():
+            sku = serializer.validated_data['sku']
+            # A later row for the same sku wins
+            replaced = valid.pop(sku, None)
+            if replaced is not None:
+                skip(report, replaced[0], sku, line_number)
+            valid[sku] = (line_number, {**existing.get(sku, {}), **serializer.validated_data})
+        else:
+            reject(report, line_number, serializer.errors)
+
+    valid = check_relations(valid, report)
+    if not valid:
+        return
+
+    with transaction.atomic():
+        upsert_products(owner, valid.values())
+        replace_tags(owner, valid.values())
+
+    report['updated'] += sum(1 for sku in valid if sku in existing)
+    report['created'] += sum(1 for sku in valid if sku not in existing)
+
+
+def sku_of(row):
+    sku = row.get('sku') if isinstance(row, dict) else None
+    if isinstance(sku, (str, int)) and not isinstance(sku, bool):
+        return str(sku).strip() or None
+    return None
+
+
+def check_relations(valid, report):
+    # Checked against the in-memory tables; only unknown ids hit the database
+    category_ids = {data['category'] for _, data in valid.values() if 'category' in data}
+    tag_ids = {pk for _, data in valid.values() for pk in data.get('tags', ())}
+    categories = category_table.existing(category_ids)
+    tags = tag_table.existing(tag_ids)
+
+    checked = {}
+    for sku, (line_number, data) in valid.items():
+        errors = {}
+        if 'category' in data and data['category'] not in categories:
+            errors['category'] = [f'Invalid pk "{data["category"]}" - object does not exist.']
+        missing = [pk for pk in data.get('tags', ()) if pk not in tags]
+        if missing:
+            errors['tags'] = [f'Invalid pk "{pk}" - object does not exist.' for pk in missing]
+        if errors:
+            reject(report, line_number, errors)
+        else:
+            checked[sku] = (line_number, data)
+    return checked
+
+
+def reject(report, line_number, errors):
+    report['failed'] += 1
+    if len(report['errors']) < MAX_REPORTED_ERRORS:
+        report['errors'].append({'line': line_number, 'errors': errors})
+
+
+def skip(report, line_number, sku, replaced_by):
+    report['skipped'] += 1
+    if len(report['duplicates']) < MAX_REPORTED_ERRORS:
+        report['duplicates'].append({'line': line_number, 'sku': sku, 'replaced_by': replaced_by})
+
+
+def upsert_products(owner, rows):
+    """
+    Insert new skus and update existing ones with a single statement per
+    batch. Updates carry their stored values for any column the file left
+    out, so every row writes the same set of columns.
+    """
+    products = []
+    for _, data in rows:
+        fields = {key: value for key, value in data.items() if key != 'tags'}
+        fields['category_id'] = fields.pop('category')
+        if not fields.get('slug'):
+            fields['slug'] = slugify(fields['title'])
+        products.append(Product(owner=owner, **fields))
+
+    Product.objects.bulk_create(
+        products,
+        update_conflicts=True,
+        # MySQL matches any unique key and rejects an explicit target
+        unique_fields=(
+            ['owner', 'sku']
+            if connection.features.supports_update_conflicts_with_target
+            else None
+        ),
+        update_fields=sorted(UPSERT_FIELDS) + ['updated_at'],
+    )
+
+
+def replace_tags(owner, rows):
+    tagged = {data['sku']: data['tags'] for _, data in rows if 'tags' in data}
+    if not tagged:
+        return
+
+    ids = dict(
+        Product.objects.filter(owner=owner, sku__in=tagged).values_list('sku', 'id')
+    )
+    through = Product.tags.through
+    through.objects.filter(product_id__in=ids.values()).delete()
+    through.objects.bulk_create([
+        through(product_id=ids[sku], tag_id=tag_id)
+        for sku, tag_ids in tagged.items()
+        for tag_id in set(tag_ids)
+    ])
+
+
+class Echo:
+    """File-like object whose write() returns the line for streaming."""
+
+    def write(self, value):
+        return value
+
+
+def export_products(owner, fmt):
+    """
+    Yield the owner's products as CSV or JSON Lines, reading them in id
+    order in chunks of EXPORT_CHUNK_SIZE so the full catalog is never held
+    in memory.
+    """
+    writer = csv.writer(Echo())
+    if fmt == 'csv':
+        yield writer.writerow(EXPORT_FIELDS)
+
+    last_id = 0
+    while True:
+        rows = list(
+            Product.objects.filter(owner=owner, id__gt=last_id)
+            .order_by('id')
+            .values('id', 'category_id', *[f for f in EXPORT_FIELDS if f not in ('category', 'tags')])
+            [:EXPORT_CHUNK_SIZE]
+        )
+        if not rows:
+            return
+        last_id = rows[-1]['id']
+
+        tags = {}
+        for product_id, tag_id in Product.tags.through.objects.filter(
+            product_id__in=[row['id'] for row in rows]
+        ).values_list('product_id', 'tag_id'):
+            tags.setdefault(product_id, []).append(tag_id)
+
+        for row in rows:
+            row['category'] = row.pop('category_id')
+            row['tags'] = sorted(tags.get(row.pop('id'), []))
+            if fmt == 'csv':
+                row['tags'] = TAG_SEPARATOR.join(str(pk) for pk in row['tags'])
+                yield writer.writerow([row[field] for field in EXPORT_FIELDS])
+            else:
+                yield json.dumps({field: row[field] for field in EXPORT_FIELDS}) + '\n'
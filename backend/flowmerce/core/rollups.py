@@ -0,0 +1,131 @@
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Q, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .models import DailySalesRollup, Order
+
+# Order fields whose changes move revenue or counts between rollup rows
+ROLLUP_FIELDS = {'employee', 'employee_id', 'amount', 'status', 'created_at'}
+
+
+def rollup_day(created_at):
+    return timezone.localtime(created_at).date()
+
+
+def order_snapshot(order):
+    """The parts of an order that contribute to its rollup row."""
+    return {
+        'employee_id': order.employee_id,
+        'day': rollup_day(order.created_at),
+        'amount': order.amount or 0,
+        'status': order.status,
+    }
+
+
+def apply_delta(snapshot, sign):
+    """
+    Add (sign=1) or remove (sign=-1) one order's contribution to its day.
+    Counters are moved with F() so concurrent checkouts never lose updates.
+    """
+    changes = {
+        'revenue': F('revenue') + sign * snapshot['amount'],
+        'order_count': F('order_count') + sign,
+    }
+    status_field = DailySalesRollup.STATUS_FIELDS.get(snapshot['status'])
+    if status_field:
+        changes[status_field] = F(status_field) + sign
+
+    rows = DailySalesRollup.objects.filter(
+        employee_id=snapshot['employee_id'], day=snapshot['day']
+    )
+    if rows.update(**changes) or sign < 0:
+        return
+
+    try:
+        with transaction.atomic():
+            initial = {'revenue': snapshot['amount'], 'order_count': 1}
+            if status_field:
+                initial[status_field] = 1
+            DailySalesRollup.objects.create(
+                employee_id=snapshot['employee_id'], day=snapshot['day'], **initial
+            )
+    except IntegrityError:
+        # Another worker created the row first
+        rows.update(**changes)
+
+
+def stored_snapshot(order):
+    """Snapshot of the order as currently saved, before an update lands."""
+    stored = (
+        Order.objects.filter(pk=order.pk)
+        .values('employee_id', 'created_at', 'amount', 'status')
+        .first()
+    )
+    if stored is None:
+        return None
+    return {
+        'employee_id': stored['employee_id'],
+        'day': rollup_day(stored['created_at']),
+        'amount': stored['amount'] or 0,
+        'status': stored['status'],
+    }
+
+
+def record_order_change(previous, order):
+    """
+    Move an order's contribution from its previous snapshot (None when the
+    order is new) to its current one. Unchanged orders cost no queries.
+    """
+    current = order_snapshot(order)
+    if previous == current:
+        return
+    if previous is not None:
+        apply_delta(previous, -1)
+    apply_delta(current, 1)
+
+
+def record_order_deleted(previous):
+    if previous is not None:
+        apply_delta(previous, -1)
+
+
+@transaction.atomic
+def backfill(employees=None, batch_size=1000):
+    """
+    Rebuild rollup rows from the order table, for all employees or only the
+    given ones. Returns the number of rows written.
+    """
+    orders = Order.objects.all()
+    rollups = DailySalesRollup.objects.all()
+    if employees is not None:
+        orders = orders.filter(employee__in=employees)
+        rollups = rollups.filter(employee__in=employees)
+
+    rows = (
+        orders.annotate(day=TruncDate('created_at'))
+        .values('employee_id', 'day')
+        .annotate(
+            revenue=Sum('amount'),
+            order_count=Count('id'),
+            **{
+                field: Count('id', filter=Q(status=status))
+                for status, field in DailySalesRollup.STATUS_FIELDS.items()
+            }
+        )
+        .order_by()
+    )
+
+    rollups.delete()
+
+    written = 0
+    batch = []
+    for row in rows.iterator(chunk_size=batch_size):
+        batch.append(DailySalesRollup(**row))
+        if len(batch) >= batch_size:
+            written += len(DailySalesRollup.objects.bulk_create(batch))
+            batch = []
+    if batch:
+        written += len(DailySalesRollup.objects.bulk_create(batch))
+
+    return written
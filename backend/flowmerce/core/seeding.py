@@ -0,0 +1,250 @@
+import random
+import re
+from datetime import timedelta
+
+from django.contrib.auth.hashers import make_password
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .models import (
+    Category,
+    DailySalesRollup,
+    Order,
+    OrderItem,
+    Plan,
+    Product,
+    Profile,
+    Subscription,
+    Tag,
+    User,
+)
+from .catalog import invalidate_taxonomy
+from .rollups import backfill
+from .sequences import order_numbers
+
+SEED_PASSWORD = 'seed-password'
+SEED_STOCK = 10 ** 6
+ORDER_STATUSES = [Order.COMPLETED] * 8 + [Order.PENDING, Order.CANCELLED]
+
+
+def seed_emails(prefix, tenants):
+    return [f"{prefix}{i}@flowmerce.local" for i in range(tenants)]
+
+
+def seed_pattern(prefix, name, suffix=''):
+    # Only the exact generated values, so real rows sharing the prefix are left alone
+    return rf'^{re.escape(prefix)}{name}[0-9]+{re.escape(suffix)}$'
+
+
+def seeded_users(prefix):
+    return User.objects.filter(
+        email__regex=seed_pattern(prefix, '', '@flowmerce.local')
+    ).order_by('id')
+
+
+def seeded_categories(prefix):
+    return Category.objects.filter(slug__regex=seed_pattern(prefix, 'category-'))
+
+
+def seeded_tags(prefix):
+    return Tag.objects.filter(slug__regex=seed_pattern(prefix, 'tag-'))
+
+
+def delete_seeded(prefix):
+    """
+    Remove tenants created with `prefix` and everything they own. Orders,
+    items and products are removed with plain SQL DELETE statements,
+    skipping the per-row signals a cascade from the users would send.
+    """
+    users = seeded_users(prefix)
+    user_ids = list(users.values_list('id', flat=True))
+    qn = connection.ops.quote_name
+    in_users = f"IN ({', '.join(['%s'] * len(user_ids))})"
+
+    def column(model, name):
+        return qn(model._meta.get_field(name).column)
+
+    def owned(model, owner):
+        return f"{column(model, owner)} {in_users}"
+
+    def owned_ids(model, owner):
+        return f"SELECT {column(model, 'id')} FROM {qn(model._meta.db_table)} WHERE {owned(model, owner)}"
+
+    # Children first; each condition takes the user ids as its parameters
+    deletes = [
+        (OrderItem, f"{column(OrderItem, 'order')} IN ({owned_ids(Order, 'employee')})"),
+        (DailySalesRollup, owned(DailySalesRollup, 'employee')),
+        (Order, owned(Order, 'employee')),
+        (Product.tags.through, f"{column(Product.tags.through, 'product')} IN ({owned_ids(Product, 'owner')})"),
+        (Product, owned(Product, 'owner')),
+    ]
+
+    with transaction.atomic():
+        if user_ids:
+            with connection.cursor() as cursor:
+                for model, condition in deletes:
+                    cursor.execute(f"DELETE FROM {qn(model._meta.db_table)} WHERE {condition}", user_ids)
+        users.delete()
+        seeded_categories(prefix).filter(products__isnull=True).delete()
+        seeded_tags(prefix).filter(products__isnull=True).delete()
+
+
+def chunked(items, size):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def orders_on_day(orders, days, day):
+    # Spreads a tenant's orders evenly over the period, oldest day first
+    return (day + 1) * orders // days - day * orders // days
+
+
+def seed_tenants(prefix, tenants, products=50, orders=200, items_per_order=3,
+                 categories=10, tags=30, tags_per_product=2, months=6,
+                 expired=0, seed=0, chunk_size=5000, progress=None):
+    """
+    Create synthetic tenants, each with a subscription, its own products
+    and orders spread over the last `months` months. The last `expired`
+    tenants get an expired subscription. Categories and tags are shared
+    and named after the prefix.
+
+    Rows are written with bulk_create in chunks of `chunk_size`, each chunk
+    in its own transaction, so model signals do not run and memory stays
+    flat. Orders are created day by day, oldest first, so order numbers
+    follow created_at. The sales rollup is rebuilt for the new tenants at
+    the end. Every tenant logs in with SEED_PASSWORD.
+    """
+    rng = random.Random(seed)
+    report = progress or (lambda message: None)
+    now = timezone.now()
+    users = seeded_users(prefix)
+
+    report(f"Users: {tenants}")
+    password = make_password(SEED_PASSWORD)
+    for emails in chunked(seed_emails(prefix, tenants), chunk_size):
+        User.objects.bulk_create(
+            [User(email=email, name=email.split('@')[0], password=password) for email in emails]
+        )
+    user_ids = list(users.values_list('id', flat=True))
+
+    plan, _ = Plan.objects.get_or_create(code='pro', defaults={'name': 'Pro'})
+    active_until = len(user_ids) - expired
+    for start, ids in enumerate(chunked(user_ids, chunk_size)):
+        offset = start * chunk_size
+        with transaction.atomic():
+            Profile.objects.bulk_create([Profile(user_id=pk) for pk in ids])
+            Subscription.objects.bulk_create([
+                Subscription(
+                    user_id=pk,
+                    plan=plan,
+                    amount=0,
+                    start_date=now - timedelta(days=30),
+                    end_date=now + timedelta(days=30) if offset + i < active_until else now - timedelta(days=1),
+                    status=Subscription.ACTIVE if offset + i < active_until else Subscription.EXPIRED,
+                )
+                for i, pk in enumerate(ids)
+            ])
+
+    Category.objects.bulk_create(
+        [Category(title=f"Category {n}", slug=f"{prefix}category-{n}") for n in range(categories)],
+        ignore_conflicts=True,
+    )
+    Tag.objects.bulk_create(
+        [Tag(title=f"Tag {n}", slug=f"{prefix}tag-{n}") for n in range(tags)],
+        ignore_conflicts=True,
+    )
+    invalidate_taxonomy()
+    category_ids = list(seeded_categories(prefix).values_list('id', flat=True))
+    tag_ids = list(seeded_tags(prefix).values_list('id', flat=True))
+
+    report(f"Products: {len(user_ids) * products}")
+    catalog = {}
+    tenants_per_chunk = max(chunk_size // max(products, 1), 1)
+    for owners in chunked(user_ids, tenants_per_chunk):
+        with transaction.atomic():
+            Product.objects.bulk_create([
+                Product(
+                    owner_id=owner,
+                    category_id=rng.choice(category_ids),
+                    title=f"Product {n}",
+                    slug=f"product-{n}",
+                    sku=f"SKU-{n:06d}",
+                    price=rng.randint(100, 5000),
+                    stock=SEED_STOCK,
+                )
+                for owner in owners
+                for n in range(products)
+            ], batch_size=chunk_size)
+
+            rows = Product.objects.filter(owner_id__in=owners).values_list(
+                'id', 'owner_id', 'title', 'price', 'sku'
+            )
+            links = []
+            for row in rows:
+                catalog.setdefault(row[1], []).append(row)
+                links.extend(
+                    Product.tags.through(product_id=row[0], tag_id=tag_id)
+                    for tag_id in rng.sample(tag_ids, min(tags_per_product, len(tag_ids)))
+                )
+            Product.tags.through.objects.bulk_create(links, batch_size=chunk_size)
+
+    days = max(months * 30, 1)
+    total_orders = sum(orders for owner in user_ids if catalog.get(owner))
+    report(f"Orders: {total_orders} over {days} days")
+    numbers = iter(order_numbers.allocate_range(total_orders)) if total_orders else iter(())
+    owners = [owner for owner in user_ids if catalog.get(owner)]
+
+    for day in range(days):
+        created_at = (now - timedelta(days=days - 1 - day)).replace(hour=12, minute=0, second=0, microsecond=0)
+        batch = []
+        for owner in owners:
+            for _ in range(orders_on_day(orders, days, day)):
+                lines = rng.sample(catalog[owner], min(items_per_order, len(catalog[owner])))
+                batch.append((owner, next(numbers), lines, [rng.randint(1, 5) for _ in lines]))
+
+        for chunk in chunked(batch, chunk_size):
+            _write_orders(chunk, created_at, rng)
+
+    report("Rebuilding sales rollup")
+    backfill(employees=users)
+
+    return {
+        'tenants': len(user_ids),
+        'categories': len(category_ids),
+        'tags': len(tag_ids),
+        'products': sum(len(items) for items in catalog.values()),
+        'orders': total_orders,
+    }
+
+
+@transaction.atomic
+def _write_orders(chunk, created_at, rng):
+    Order.objects.bulk_create([
+        Order(
+            employee_id=owner,
+            number=number,
+            status=rng.choice(ORDER_STATUSES),
+            amount=sum(line[3] * quantity for line, quantity in zip(lines, quantities)),
+        )
+        for owner, number, lines, quantities in chunk
+    ])
+
+    # auto_now_add ignores given values; numbers in a chunk are consecutive
+    first, last = chunk[0][1], chunk[-1][1]
+    written = Order.objects.filter(number__range=(first, last))
+    written.update(created_at=created_at, updated_at=created_at)
+    ids = dict(written.values_list('number', 'id'))
+
+    OrderItem.objects.bulk_create([
+        OrderItem(
+            order_id=ids[number],
+            product_id=product_id,
+            product_title=title,
+            product_price=price,
+            product_sku=sku,
+            quantity=quantity,
+            price=price,
+        )
+        for owner, number, lines, quantities in chunk
+        for (product_id, _, title, price, sku), quantity in zip(lines, quantities)
+    ])
@@ -0,0 +1,91 @@
+import os
+import threading
+
+from django.conf import settings
+from django.db import router, transaction
+
+from .models import NumberSequence
+
+
+class BlockAllocator:
+    """
+    Hands out sequential numbers from ranges reserved in the NumberSequence
+    table. Each worker process reserves a block with a single locked update
+    and then serves numbers from memory, so allocation costs no queries for
+    most inserts and concurrent workers never receive the same number.
+
+    Numbers left in a block when a worker exits are skipped, so the sequence
+    can have gaps but never duplicates.
+    """
+
+    def __init__(self, name, start=1, block_size=None):
+        self.name = name
+        self.start = start
+        self._block_size = block_size
+        self._lock = threading.Lock()
+        self._blocks = []
+        self._pid = os.getpid()
+
+    @property
+    def block_size(self):
+        return self._block_size or getattr(settings, 'ORDER_NUMBER_BLOCK_SIZE', 20)
+
+    def allocate(self, using=None):
+        using = using or router.db_for_write(NumberSequence)
+
+        with self._lock:
+            # Blocks reserved before a fork belong to the parent process
+            if self._pid != os.getpid():
+                self._pid = os.getpid()
+                self._blocks = []
+
+            if self._blocks:
+                block = self._blocks[0]
+                number = block[0]
+                block[0] += 1
+                if block[0] > block[1]:
+                    self._blocks.pop(0)
+                return number
+
+        in_transaction = transaction.get_connection(using).in_atomic_block
+        first, last = self._reserve(using)
+
+        if first < last:
+            if in_transaction:
+                # The reservation only counts once the caller commits; if the
+                # transaction rolls back the range is handed out again.
+                transaction.on_commit(
+                    lambda: self._adopt(first + 1, last), using=using
+                )
+            else:
+                self._adopt(first + 1, last)
+
+        return first
+
+    def allocate_range(self, count, using=None):
+        """Reserve `count` consecutive numbers at once, for bulk inserts."""
+        using = using or router.db_for_write(NumberSequence)
+        first, last = self._reserve(using, size=count)
+        return range(first, last + 1)
+
+    def _reserve(self, using, size=None):
+        size = size or self.block_size
+
+        with transaction.atomic(using=using):
+            sequence, _ = (
+                NumberSequence.objects.using(using)
+                .select_for_update()
+                .get_or_create(name=self.name, defaults={'last_value': self.start - 1})
+            )
+            first = sequence.last_value + 1
+            sequence.last_value += size
+            sequence.save(update_fields=['last_value'])
+
+        return first, sequence.last_value
+
+    def _adopt(self, first, last):
+        with self._lock:
+            self._blocks.append([first, last])
+
+
+order_numbers = BlockAllocator('order_number', start=1000)
@@ -1,6 +1,9 @@
+from django.core.exceptions import ValidationError as DjangoValidationError
 from rest_framework import serializers
-from django.shortcuts import get_object_or_404
 from .models import User, Product, Order, OrderItem, Category, Tag, Subscription, PaymentRequest
+from .orders import create_order
+from .images import variant_urls
+from .catalog import category_table, tag_table
 
 class UserSerializer(serializers.ModelSerializer):
     password = serializers.CharField(write_only=True, required=True, min_length=6)
@@ -25,25 +28,40 @@ class CategorySerializer(serializers.ModelSerializer):
         fields = '__all__'
 
 
+class CachedRelatedField(serializers.PrimaryKeyRelatedField):
+    """Resolves ids from a core.catalog.LookupTable instead of a query each."""
+
+    def __init__(self, table, **kwargs):
+        self.table = table
+        kwargs.setdefault('queryset', table.model.objects.all())
+        super().__init__(**kwargs)
+
+    def to_internal_value(self, data):
+        if isinstance(data, bool):
+            self.fail('incorrect_type', data_type=type(data).__name__)
+        try:
+            pk = self.table.model._meta.pk.to_python(data)
+        except (TypeError, ValueError, DjangoValidationError):
+            self.fail('incorrect_type', data_type=type(data).__name__)
+        row = self.table.get(pk)
+        if row is None:
+            self.fail('does_not_exist', pk_value=data)
+        return row
+
+
 class ProductSerializer(serializers.ModelSerializer):
     owner = serializers.StringRelatedField(read_only=True)  # Added: show product owner
-    category = serializers.PrimaryKeyRelatedField(
-        queryset=Category.objects.all(),
-        write_only=True
-    )
-    category_details = CategorySerializer(source='category', read_only=True)
-    tags = serializers.PrimaryKeyRelatedField(
-        many=True,
-        queryset=Tag.objects.all(),
-        required=False
-    )
+    category = CachedRelatedField(category_table, write_only=True)
+    category_details = serializers.SerializerMethodField()
+    tags = CachedRelatedField(tag_table, many=True, required=False)
+    image_variants = serializers.SerializerMethodField()
 
     class Meta:
         model = Product
         fields = [
             'id', 'title', 'description', 'price', 'quantity', 'stock',
-            'sku', 'image', 'status', 'owner', 'category', 'category_details',
-            'tags', 'slug', 'created_at', 'updated_at'
+            'sku', 'image', 'image_variants', 'status', 'owner', 'category',
+            'category_details', 'tags', 'slug', 'created_at', 'updated_at'
         ]
         extra_kwargs = {
             'image': {'required': False, 'allow_null': True},
@@ -56,6 +74,19 @@ class ProductSerializer(serializers.ModelSerializer):
         except (TypeError, ValueError):
             raise serializers.ValidationError("Price must be a number")
 
+    def get_category_details(self, obj):
+        # From the in-memory category table rather than a query per row
+        category = category_table.get(obj.category_id)
+        return CategorySerializer(category).data if category is not None else None
+
+    def get_image_variants(self, obj):
+        # Resized WebP URLs (thumb, medium); empty until they have been generated
+        urls = variant_urls(obj)
+        request = self.context.get('request')
+        if request is not None:
+            urls = {name: request.build_absolute_uri(url) for name, url in urls.items()}
+        return urls
+
 
 class OrderItemSerializer(serializers.ModelSerializer):
     product_title = serializers.CharField(required=False)
@@ -75,42 +106,87 @@ class OrderItemSerializer(serializers.ModelSerializer):
         ]
 
 
+class RelatedIdField(serializers.PrimaryKeyRelatedField):
+    """Accepts a related id without looking it up; the caller resolves ids in bulk."""
+
+    def to_internal_value(self, data):
+        if isinstance(data, bool):
+            self.fail('incorrect_type', data_type=type(data).__name__)
+        try:
+            return int(data)
+        except (TypeError, ValueError):
+            self.fail('incorrect_type', data_type=type(data).__name__)
+
+
+class ProductIdField(RelatedIdField):
+    """
+    Accepts a product id without looking it up. OrderSerializer resolves all
+    line items together so an order costs one product query, not one per line.
+    """
+
+
+class ProductImportSerializer(ProductSerializer):
+    """
+    ProductSerializer rules for one row of a bulk import. Category and tag
+    ids are checked for the whole batch at once by core.product_io.
+    """
+    category = RelatedIdField(queryset=Category.objects.all())
+    tags = RelatedIdField(many=True, queryset=Tag.objects.all(), required=False)
+
+    class Meta(ProductSerializer.Meta):
+        fields = [
+            'sku', 'title', 'description', 'price', 'quantity', 'stock',
+            'status', 'category', 'tags', 'slug'
+        ]
+
+
+class OrderLineSerializer(OrderItemSerializer):
+    product = ProductIdField(queryset=Product.objects.all())
+
+
 class OrderSerializer(serializers.ModelSerializer):
-    items = OrderItemSerializer(many=True)
+    items = OrderLineSerializer(many=True)
     employee_email = serializers.CharField(source='employee.email', read_only=True)
     amount = serializers.DecimalField(read_only=True, max_digits=10, decimal_places=2)
+    # Lines ordered beyond the stock on hand; only known when the order is created
+    oversold = serializers.SerializerMethodField()
 
     class Meta:
         model = Order
-        fields = ['id', 'number', 'employee_email', 'amount', 'status', 'created_at', 'items']
+        fields = ['id', 'number', 'employee_email', 'amount', 'status', 'created_at', 'items', 'oversold']
+
+    def get_oversold(self, obj):
+        return getattr(obj, 'oversold', [])
+
+    def validate_items(self, items):
+        # Resolve every product in a single query
+        products = Product.objects.in_bulk({item['product'] for item in items})
+
+        missing = sorted({item['product'] for item in items} - products.keys())
+        if missing:
+            raise serializers.ValidationError(
+                [f'Invalid pk "{pk}" - object does not exist.' for pk in missing]
+            )
+
+        for item in items:
+            item['product'] = products[item['product']]
+        return items
 
     def create(self, validated_data):
         items_data = validated_data.pop('items', [])
-        user = self.context['request'].user
-
-        # Create the order
-        order = Order.objects.create(employee=user, **validated_data)
-
-        # Create the items
-        for item_data in items_data:
-            product_field = item_data.get('product')
-            product = product_field if isinstance(product_field, Product) else get_object_or_404(Product, id=product_field)
-
-            OrderItem.objects.create(
-                order=order,
-                product=product,
-                quantity=item_data['quantity'],
-                price=product.price,
-                product_title=product.title,
-                product_price=product.price,
-                product_sku=product.sku,
-            )
+        employee = validated_data.pop('employee', self.context['request'].user)
+
+        return create_order(employee, items_data, **validated_data)
+
 
-        # Calculate total order amount
-        order.amount = sum(item.total_price for item in order.items.all())
-        order.save(update_fields=['amount'])
+class OrderListSerializer(serializers.ModelSerializer):
+    """Order without nested items, for lightweight list views."""
+    employee_email = serializers.CharField(source='employee.email', read_only=True)
+    amount = serializers.DecimalField(read_only=True, max_digits=10, decimal_places=2)
 
-        return order
+    class Meta:
+        model = Order
+        fields = ['id', 'number', 'employee_email', 'amount', 'status', 'created_at']
 
 
 class TagSerializer(serializers.ModelSerializer):
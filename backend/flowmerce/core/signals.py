@@ -1,9 +1,20 @@
-from django.db.models.signals import post_save, pre_save
+import logging
+
+from django.db.models.signals import m2m_changed, post_save, post_delete, pre_delete, pre_save
 from django.utils.text import slugify
 from django.dispatch import receiver
-from django.core.mail import send_mail
+from django.db import transaction
 from django.conf import settings
-from .models import  Order, Product, Profile, OrderItem
+from .models import  Category, Order, Product, Profile, Subscription, SubscriptionGrant, Tag
+from .outbox import enqueue_email
+from .analytics import invalidate_summary
+from .subscriptions import invalidate_subscription_state
+from .business_stats import record_new_order, invalidate_business_stats
+from .rollups import ROLLUP_FIELDS, record_order_change, record_order_deleted, stored_snapshot
+from .images import needs_variants, schedule_variants
+from .catalog import CATEGORIES, TAGS, invalidate, invalidate_products
+
+logger = logging.getLogger(__name__)
 
 
 @receiver(post_save, sender=settings.AUTH_USER_MODEL)
@@ -21,41 +32,35 @@ def create_new_product(sender, instance, created, **kwargs):
         instance.save()
 
 
-@receiver(post_save, sender=OrderItem)
-def product_stock_update(sender, instance, created, **kwargs):
-    if created:
-        product = instance.product
-        product.stock -= instance.quantity
-        if product.stock <= 0:
-            product.status = 'out of stock'
-        product.save()
-
-
 @receiver(pre_save, sender=Product)
 def set_product_slug(sender, instance, **kwargs):
     if not instance.slug:
         instance.slug = slugify(instance.title)
 
 
+@receiver(post_save, sender=Product)
+def product_image_changed(sender, instance, **kwargs):
+    if needs_variants(instance):
+        schedule_variants(instance)
+
+
 @receiver(post_save, sender=Order)
 def new_order(sender, instance, created, **kwargs):
     if created:
-        # Collect product titles from related OrderItems
-        items = instance.items.all()
-        product_titles = ", ".join([item.product.title for item in items]) or "No products"
-
-        print(
-            f'🧾 New order created: {instance.number} by {instance.employee.email}. '
-            f'Products: {product_titles}'
-        )
-
-        # Send confirmation email
-        order_confirmation_email(instance)
+        # Items are written after the order row, so wait for the commit
+        transaction.on_commit(lambda: order_confirmation_email(instance))
 
 
 def order_confirmation_email(order):
-    items = order.items.all()
-    product_titles = ", ".join([item.product.title for item in items]) or "No products"
+    # Snapshotted titles avoid loading each product
+    titles = list(order.items.values_list('product_title', flat=True))
+    product_titles = ", ".join(titles) or "No products"
+    recipient = order.employee.email
+
+    logger.info(
+        "New order created: %s by %s. Products: %s",
+        order.number, recipient, product_titles,
+    )
 
     subject = f'Internal Order Confirmation: {order.number}'
     message = (
@@ -64,12 +69,98 @@ def order_confirmation_email(order):
         f'Products: {product_titles}\n\n'
         f'Thank you for processing this order internally.'
     )
-    recipient = order.employee.email
 
-    send_mail(
-        subject,
-        message,
-        settings.DEFAULT_FROM_EMAIL,
-        [recipient],
-        fail_silently=False,
-    )
+    # Delivered by the send_queued_emails worker
+    enqueue_email(subject, message, [recipient])
+
+
+# Item changes always go through an order save (amount), so the Order
+# receivers also cover the order item write paths.
+@receiver(post_save, sender=Order)
+@receiver(post_delete, sender=Order)
+def order_analytics_changed(sender, instance, **kwargs):
+    invalidate_summary(instance.employee_id)
+
+
+@receiver(post_save, sender=Order)
+@receiver(post_delete, sender=Order)
+def order_business_stats_changed(sender, instance, created=False, **kwargs):
+    if created:
+        # Items exist once the order commits; fold it into the cached stats
+        transaction.on_commit(lambda: record_new_order(instance))
+    else:
+        invalidate_business_stats(instance.employee_id)
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+def product_analytics_changed(sender, instance, **kwargs):
+    if instance.owner_id:
+        invalidate_summary(instance.owner_id)
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+def product_catalog_changed(sender, instance, **kwargs):
+    invalidate_products(instance.owner_id)
+
+
+@receiver(m2m_changed, sender=Product.tags.through)
+def product_tags_changed(sender, instance, action, reverse, **kwargs):
+    if not action.startswith('post_'):
+        return
+    if reverse:
+        # Changed from the tag's side; product lists depend on tags anyway
+        invalidate(TAGS)
+    else:
+        invalidate_products(instance.owner_id)
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def category_catalog_changed(sender, instance, **kwargs):
+    invalidate(CATEGORIES)
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+def tag_catalog_changed(sender, instance, **kwargs):
+    invalidate(TAGS)
+
+
+@receiver(pre_save, sender=Order)
+def remember_order_rollup(sender, instance, raw=False, update_fields=None, **kwargs):
+    if raw or instance._state.adding:
+        return
+    if update_fields is not None and not ROLLUP_FIELDS.intersection(update_fields):
+        return
+    instance._rollup_previous = stored_snapshot(instance)
+
+
+@receiver(post_save, sender=Order)
+def update_order_rollup(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    if created:
+        record_order_change(None, instance)
+    elif hasattr(instance, '_rollup_previous'):
+        record_order_change(instance.__dict__.pop('_rollup_previous'), instance)
+
+
+@receiver(pre_delete, sender=Order)
+def remember_deleted_order_rollup(sender, instance, **kwargs):
+    # The in-memory instance may be stale; remove what was actually stored
+    instance._rollup_previous = stored_snapshot(instance)
+
+
+@receiver(post_delete, sender=Order)
+def remove_order_rollup(sender, instance, **kwargs):
+    record_order_deleted(instance.__dict__.pop('_rollup_previous', None))
+
+
+@receiver(post_save, sender=Subscription)
+@receiver(post_delete, sender=Subscription)
+@receiver(post_save, sender=SubscriptionGrant)
+@receiver(post_delete, sender=SubscriptionGrant)
+def subscription_changed(sender, instance, **kwargs):
+    invalidate_subscription_state(instance.user_id)
@@ -0,0 +1,80 @@
+import logging
+from collections import Counter
+
+from django.db import transaction
+from django.db.models import Case, F, PositiveIntegerField, Value, When
+from django.utils import timezone
+
+from .catalog import invalidate_products
+from .models import Product
+
+logger = logging.getLogger(__name__)
+
+OUT_OF_STOCK = 'out_of_stock'
+
+
+def reserve_stock(items):
+    """
+    Decrement stock for a batch of order items in a single UPDATE, flipping
+    products that run out to out-of-stock in the same statement.
+
+    Returns the oversold lines as dicts with the product id, the quantity
+    requested and the stock that was on hand. Oversold products are left at
+    zero stock.
+    """
+    quantities = Counter()
+    for item in items:
+        quantities[item.product_id] += item.quantity
+
+    if not quantities:
+        return []
+
+    with transaction.atomic():
+        # Lock the rows so the oversold report matches what the update applies
+        rows = list(
+            Product.objects.select_for_update()
+            .filter(pk__in=quantities)
+            .values_list('pk', 'stock', 'owner_id')
+        )
+        on_hand = {pk: stock for pk, stock, _ in rows}
+
+        oversold = [
+            {'product': pk, 'requested': quantity, 'available': on_hand[pk]}
+            for pk, quantity in quantities.items()
+            if pk in on_hand and quantity > on_hand[pk]
+        ]
+
+        # Subtraction is guarded because stock is UNSIGNED on MySQL.
+        # status comes first: MySQL evaluates SET clauses left to right, so
+        # it must see the stock value from before the decrement.
+        Product.objects.filter(pk__in=quantities).update(
+            status=Case(
+                *[
+                    When(pk=pk, stock__lte=quantity, then=Value(OUT_OF_STOCK))
+                    for pk, quantity in quantities.items()
+                ],
+                default=F('status'),
+            ),
+            stock=Case(
+                *[
+                    When(pk=pk, stock__gt=quantity, then=F('stock') - quantity)
+                    for pk, quantity in quantities.items()
+                ],
+                When(pk__in=list(quantities), then=Value(0)),
+                default=F('stock'),
+                output_field=PositiveIntegerField(),
+            ),
+            updated_at=timezone.now(),
+        )
+
+        # A queryset update sends no signals
+        for owner_id in {owner_id for _, _, owner_id in rows}:
+            invalidate_products(owner_id)
+
+    for line in oversold:
+        logger.warning(
+            "Product %s oversold: requested %s, %s in stock",
+            line['product'], line['requested'], line['available']
+        )
+
+    return oversold
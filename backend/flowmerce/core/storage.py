@@ -0,0 +1,34 @@
+import hashlib
+import os
+
+from django.core.files.storage import FileSystemStorage
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """
+    Stores uploads under the SHA-256 of their content, e.g.
+    products/3f/3fa4...c1.jpeg. Uploading a file that is already stored
+    writes nothing and returns the existing name, so identical images are
+    kept once however many products use them.
+    """
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+
+        digest = hashlib.sha256()
+        if hasattr(content, 'seek'):
+            content.seek(0)
+        for chunk in content.chunks():
+            digest.update(chunk)
+        if hasattr(content, 'seek'):
+            content.seek(0)
+
+        directory = os.path.dirname(name)
+        extension = os.path.splitext(name)[1].lower()
+        checksum = digest.hexdigest()
+        name = os.path.join(directory, checksum[:2], f"{checksum}{extension}")
+
+        if self.exists(name):
+            return name
+        return super().save(name, content, max_length=max_length)
@@ -0,0 +1,107 @@
+from dataclasses import dataclass
+from datetime import datetime
+
+from django.utils import timezone
+
+from .cache import Namespace
+from .models import Subscription
+
+STATE_CACHE_TIMEOUT = 60 * 60
+
+
+@dataclass(frozen=True)
+class SubscriptionState:
+    """
+    Read-only snapshot of a user's subscription and plan, safe to cache.
+    Mirrors the Subscription methods the access checks rely on.
+    """
+    id: int
+    user_id: int
+    status: str
+    end_date: datetime
+    is_blocked: bool
+    plan_code: str
+    ai_requests_used: int
+    ai_request_limit: int
+
+    @classmethod
+    def from_subscription(cls, subscription):
+        return cls(
+            id=subscription.pk,
+            user_id=subscription.user_id,
+            status=subscription.status,
+            end_date=subscription.end_date,
+            is_blocked=subscription.is_blocked,
+            plan_code=subscription.plan.code.lower(),
+            ai_requests_used=subscription.ai_requests_used,
+            ai_request_limit=subscription.ai_request_limit,
+        )
+
+    def is_active(self):
+        return (
+            self.status in Subscription.ACTIVE_STATUSES
+            and self.end_date
+            and self.end_date > timezone.now()
+        )
+
+    def days_remaining(self):
+        return max((self.end_date - timezone.now()).days, 0)
+
+
+states = Namespace('subscription_state', timeout=STATE_CACHE_TIMEOUT)
+
+
+def get_subscription_state(user):
+    """
+    Return the user's SubscriptionState, or None if they have none.
+
+    Lookups go through the per-process LRU, then the shared cache, then the
+    database. Entries are keyed by a per-user version that subscription
+    writes bump, so a warm lookup costs no queries. The version lives in
+    CACHES['default']; workers see each other's changes at once only when
+    that cache is shared between them (Redis, or the SQLite file backend),
+    and otherwise after STATE_CACHE_TIMEOUT.
+    """
+    def load():
+        subscription = (
+            Subscription.objects.select_related('plan')
+            .filter(user_id=user.pk)
+            .first()
+        )
+        return SubscriptionState.from_subscription(subscription) if subscription else None
+
+    return states.get_or_set(user.pk, load)
+
+
+def subscription_state_for(request):
+    """
+    Memoize the state on the underlying HttpRequest so the middleware and
+    every permission check share a single lookup per request.
+    """
+    http_request = getattr(request, '_request', request)
+    user = request.user
+
+    memo = getattr(http_request, '_subscription_state', None)
+    if memo is not None and memo[0] == user.pk:
+        return memo[1]
+
+    state = get_subscription_state(user)
+    http_request._subscription_state = (user.pk, state)
+    return state
+
+
+def invalidate_subscription_state(user_id):
+    states.invalidate(user_id)
+
+
+def transition_status(state, status):
+    """
+    Move a subscription to a new status with one conditional UPDATE. Does
+    nothing when the cached state already has that status, so each
+    transition is written once rather than on every request.
+    """
+    if state.status == status:
+        return
+
+    Subscription.objects.filter(pk=state.id, status=state.status).update(status=status)
+    invalidate_subscription_state(state.user_id)
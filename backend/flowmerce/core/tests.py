@@ -0,0 +1,920 @@
+import io
+import os
+import tempfile
+import threading
+import warnings
+from datetime import timedelta
+from http.server import ThreadingHTTPServer
+from unittest import mock, skipUnless
+
+from django.contrib import admin
+from django.contrib.messages.storage.fallback import FallbackStorage
+from django.core import mail
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.mail.backends.base import BaseEmailBackend
+from django.core.management import CommandError, call_command
+from django.db import connection, connections, router, transaction
+from django.db.models import Count
+from django.http import HttpResponse
+from django.db.utils import ConnectionHandler, load_backend
+from django.test import RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.urls import resolve
+from django.utils import timezone
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from . import benchmarks, db_routers, views, views_ai
+from .admin import OrderItemAdmin
+from .assistant_cache import response_cache
+from .business_stats import get_business_stats
+from .catalog import ConditionalListMixin, category_table, lookup_tables
+from .db_backends.pool import PoolExhausted
+from .db_routers import REPLICA, is_pinned, pin_to_primary, replica_reads
+from .management.commands.fake_ollama import FakeOllamaHandler
+from .metering import ai_requests_used, flush_usage, pending_key, reconcile_usage, record_ai_request
+from .middleware import replica as replica_middleware
+from .middleware.instrumentation import route_metrics
+from .middleware.replica import ReadYourWritesMiddleware
+from .middleware.subscription_middleware import SubscriptionMiddleware
+from .models import Category, DailySalesRollup, Order, OrderItem, OutboundEmail, Product, Subscription, User
+from .outbox import CLAIM_TIMEOUT, deliver_pending, enqueue_email
+from .rollups import backfill, rollup_day
+from .orders import create_order
+from .seeding import delete_seeded, seed_tenants, seeded_users
+from .sequences import BlockAllocator
+from .subscriptions import get_subscription_state
+
+# Tests never share the development cache file
+LOCAL_CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+
+
+@override_settings(CACHES=LOCAL_CACHES)
+class FlowmerceTestCase(TestCase):
+    """Starts every test with empty shared and per-process caches."""
+
+    def setUp(self):
+        cache.clear()
+        for table in lookup_tables.values():
+            table.clear()
+        response_cache.clear()
+
+
+class TenantTestCase(FlowmerceTestCase):
+    """One seeded tenant with an active subscription, products and orders."""
+
+    @classmethod
+    def setUpTestData(cls):
+        seed_tenants('test-', tenants=1, products=15, orders=30, months=1)
+        cls.user = seeded_users('test-').get()
+
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+
+class FailingEmailBackend(BaseEmailBackend):
+    def send_messages(self, messages):
+        raise ConnectionError("SMTP down")
+
+
+class OutboxTests(TestCase):
+    def test_delivers_each_email_once(self):
+        enqueue_email("Subject", "Body", ["a@example.com", "b@example.com"])
+
+        self.assertEqual(deliver_pending(), 2)
+        self.assertEqual(deliver_pending(), 0)
+
+        self.assertEqual(len(mail.outbox), 2)
+        self.assertFalse(OutboundEmail.objects.exclude(status=OutboundEmail.SENT).exists())
+
+    @override_settings(EMAIL_BACKEND='core.tests.FailingEmailBackend')
+    def test_failed_send_is_released_for_retry(self):
+        [email] = enqueue_email("Subject", "Body", ["a@example.com"])
+
+        deliver_pending()
+
+        email.refresh_from_db()
+        self.assertEqual(email.status, OutboundEmail.PENDING)
+        self.assertEqual(email.attempts, 1)
+        self.assertIn("SMTP down", email.last_error)
+        self.assertGreater(email.next_attempt_at, timezone.now())
+
+    def test_claimed_emails_are_skipped_until_the_claim_lapses(self):
+        [email] = enqueue_email("Subject", "Body", ["a@example.com"])
+        OutboundEmail.objects.filter(pk=email.pk).update(
+            status=OutboundEmail.SENDING,
+            next_attempt_at=timezone.now() + CLAIM_TIMEOUT,
+        )
+        self.assertEqual(deliver_pending(), 0)
+
+        # The worker holding the claim died
+        OutboundEmail.objects.filter(pk=email.pk).update(
+            next_attempt_at=timezone.now() - CLAIM_TIMEOUT,
+        )
+        self.assertEqual(deliver_pending(), 1)
+        self.assertEqual(len(mail.outbox), 1)
+
+
+class TenantIndexTests(TenantTestCase):
+    INDEXES = {
+        Product: ['product_owner_created_idx', 'product_owner_status_idx'],
+        Order: ['order_employee_created_idx', 'order_employee_status_idx'],
+    }
+
+    def test_indexes_exist(self):
+        with connection.cursor() as cursor:
+            for model, names in self.INDEXES.items():
+                constraints = connection.introspection.get_constraints(cursor, model._meta.db_table)
+                for name in names:
+                    self.assertIn(name, constraints)
+                    self.assertTrue(constraints[name]['index'])
+
+    @skipUnless(connection.vendor in ('sqlite', 'mysql'), "EXPLAIN output names the index")
+    def test_tenant_queries_use_the_indexes(self):
+        plans = {
+            'product_owner_created_idx': Product.objects.filter(owner=self.user).order_by('-created_at'),
+            'product_owner_status_idx': Product.objects.filter(owner=self.user, status='available').order_by(),
+            'order_employee_created_idx': Order.objects.filter(employee=self.user).order_by('-created_at', '-id'),
+            'order_employee_status_idx': (
+                Order.objects.filter(employee=self.user).order_by()
+                .values('status').annotate(count=Count('id'))
+            ),
+        }
+        for index, queryset in plans.items():
+            with self.subTest(index=index):
+                self.assertIn(index, queryset.explain())
+
+    def test_list_endpoints_query_count(self):
+        # Warm the subscription state and category/tag tables
+        self.client.get('/api/products/')
+
+        # Count, page, tags for the page
+        with self.assertNumQueries(3):
+            response = self.client.get('/api/products/')
+        self.assertEqual(response.status_code, 200)
+
+        with self.assertNumQueries(3):
+            response = self.client.get('/api/orders/')
+        self.assertEqual(response.status_code, 200)
+
+
+class SubscriptionStateTests(TenantTestCase):
+    def gate(self, path='/api/products/'):
+        request = RequestFactory().get(path)
+        request.user = self.user
+        request.resolver_match = resolve(path)
+        middleware = SubscriptionMiddleware(lambda request: HttpResponse())
+        # Run the invalidations the gate schedules, as a committed request would
+        with self.captureOnCommitCallbacks(execute=True):
+            return middleware.process_view(request, None, (), {})
+
+    def test_expiring_subscription_stays_usable_until_end_date(self):
+        Subscription.objects.filter(user=self.user).update(end_date=timezone.now() + timedelta(days=3))
+
+        # The first request flips it to expiring; later ones must not expire it
+        for _ in range(3):
+            self.assertIsNone(self.gate())
+        self.assertEqual(Subscription.objects.get(user=self.user).status, Subscription.EXPIRING)
+
+    def test_lapsed_subscription_is_blocked(self):
+        Subscription.objects.filter(user=self.user).update(end_date=timezone.now() - timedelta(days=1))
+
+        self.assertEqual(self.gate().status_code, 402)
+        self.assertEqual(Subscription.objects.get(user=self.user).status, Subscription.EXPIRED)
+
+    def test_writes_replace_the_cached_state(self):
+        self.assertFalse(get_subscription_state(self.user).is_blocked)
+
+        subscription = Subscription.objects.get(user=self.user)
+        subscription.is_blocked = True
+        with self.captureOnCommitCallbacks(execute=True):
+            subscription.save()
+
+        with self.assertNumQueries(1):
+            self.assertTrue(get_subscription_state(self.user).is_blocked)
+        with self.assertNumQueries(0):
+            get_subscription_state(self.user)
+
+
+class TruncatedOllamaHandler(FakeOllamaHandler):
+    complete = False
+
+
+class AssistantStreamTests(TenantTestCase):
+    """Streams from the fake Ollama server of the fake_ollama command."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.server = cls.start_server(FakeOllamaHandler)
+        cls.truncated_server = cls.start_server(TruncatedOllamaHandler)
+
+    @classmethod
+    def start_server(cls, handler):
+        server = ThreadingHTTPServer(('127.0.0.1', 0), handler)
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        cls.addClassCleanup(server.server_close)
+        cls.addClassCleanup(server.shutdown)
+        return server
+
+    def setUp(self):
+        super().setUp()
+        self.use_ollama(self.server)
+        self.auth = {'HTTP_AUTHORIZATION': f"Bearer {RefreshToken.for_user(self.user).access_token}"}
+
+    def use_ollama(self, server, path='/api/generate'):
+        patcher = mock.patch.object(views_ai, 'OLLAMA_GENERATE_URL', f"http://127.0.0.1:{server.server_port}{path}")
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def read(self, response):
+        # Consumed the way the WSGI handler does
+        with warnings.catch_warnings():
+            warnings.filterwarnings('ignore', 'StreamingHttpResponse must consume asynchronous')
+            return b''.join(response).decode()
+
+    def post(self, message, **headers):
+        return self.client.post(
+            '/api/assistant/stream/', {'message': message}, format='json', **headers
+        )
+
+    def test_streams_reply_on_consecutive_wsgi_requests(self):
+        # Each WSGI request runs on a new event loop; none may reuse a dead one
+        for message in ("How are sales?", "Any advice?"):
+            response = self.post(message, **self.auth)
+            self.assertEqual(response.status_code, 200)
+            body = self.read(response)
+            self.assertIn(FakeOllamaHandler.reply, body.replace('\u200b', '').strip())
+            self.assertNotIn("Streaming error", body)
+
+    async def test_streams_share_one_client_per_event_loop(self):
+        for message in ("How are sales?", "Any advice?"):
+            response = await self.async_client.post(
+                '/api/assistant/stream/', {'message': message},
+                content_type='application/json', headers={'Authorization': self.auth['HTTP_AUTHORIZATION']},
+            )
+            self.assertEqual(response.status_code, 200)
+            body = ''.join([chunk.decode() async for chunk in response.streaming_content])
+            self.assertIn(FakeOllamaHandler.reply, body)
+
+        client = views_ai.get_ollama_client()
+        self.assertIs(client, views_ai.get_ollama_client())
+        await client.aclose()
+
+    def test_complete_answer_is_cached_and_replayed(self):
+        self.read(self.post("Cache me", **self.auth))
+
+        response = self.post("Cache me", **self.auth)
+        self.assertEqual(response['X-Assistant-Cache'], 'hit')
+        self.assertIn(FakeOllamaHandler.reply, self.read(response))
+
+    def assertNotCached(self, message):
+        self.assertEqual(response_cache.stats()['size'], 0)
+        self.assertFalse(self.post(message, **self.auth).has_header('X-Assistant-Cache'))
+
+    def test_failed_stream_is_not_cached(self):
+        self.use_ollama(self.server, '/api/unknown-model')
+
+        with self.assertLogs('core.views_ai', 'ERROR'):
+            body = self.read(self.post("Unknown model", **self.auth))
+
+        self.assertIn("Streaming error", body)
+        self.assertNotCached("Unknown model")
+
+    def test_truncated_stream_is_not_cached(self):
+        self.use_ollama(self.truncated_server)
+
+        body = self.read(self.post("Dropped connection", **self.auth))
+
+        self.assertIn(FakeOllamaHandler.reply.split()[0], body)
+        self.assertNotCached("Dropped connection")
+
+    def test_failed_stream_is_not_metered(self):
+        self.use_ollama(self.server, '/api/unknown-model')
+        used = ai_requests_used(get_subscription_state(self.user))
+
+        with self.assertLogs('core.views_ai', 'ERROR'):
+            self.read(self.post("Unknown model", **self.auth))
+        response = self.client.post('/api/assistant/', {'message': "Unknown model"}, format='json')
+
+        self.assertEqual(response.status_code, 500)
+        self.assertEqual(ai_requests_used(get_subscription_state(self.user)), used)
+
+    def test_invalid_token_gets_the_authenticator_error(self):
+        response = self.post("Hi", HTTP_AUTHORIZATION="Bearer not-a-token")
+
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(response.json()['code'], 'token_not_valid')
+        self.assertIn('Bearer', response['WWW-Authenticate'])
+
+    def test_missing_credentials(self):
+        response = self.post("Hi")
+
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(response.json()['detail'], "Authentication credentials were not provided.")
+
+
+class MeteringTests(TenantTestCase):
+    def used(self):
+        return Subscription.objects.get(user=self.user).ai_requests_used
+
+    def test_per_process_cache_writes_each_request_through(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            for _ in range(3):
+                record_ai_request(self.user)
+
+        self.assertEqual(self.used(), 3)
+        self.assertEqual(ai_requests_used(get_subscription_state(self.user)), 3)
+
+
+class SharedCacheMeteringTests(TenantTestCase):
+    """Counters in a cache every process shares, as in production."""
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        shared = override_settings(CACHES={'default': {
+            'BACKEND': 'core.cache_backends.SQLiteCache',
+            'LOCATION': os.path.join(directory.name, 'cache.sqlite3'),
+        }})
+        shared.enable()
+        self.addCleanup(shared.disable)
+        super().setUp()
+
+    def used(self):
+        return Subscription.objects.get(user=self.user).ai_requests_used
+
+    def test_counts_stay_pending_until_flushed(self):
+        for _ in range(3):
+            record_ai_request(self.user)
+        self.assertEqual(self.used(), 0)
+        self.assertEqual(ai_requests_used(get_subscription_state(self.user)), 3)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(flush_usage(), 3)
+        self.assertEqual(self.used(), 3)
+        self.assertEqual(ai_requests_used(get_subscription_state(self.user)), 3)
+
+    def test_reconcile_refreshes_drifted_states(self):
+        subscription = Subscription.objects.get(user=self.user)
+        get_subscription_state(self.user)
+        # Changed behind the cache's back, e.g. by a manual fix in the database
+        Subscription.objects.filter(pk=subscription.pk).update(ai_requests_used=10)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            corrections = reconcile_usage()
+
+        self.assertEqual(corrections, [(subscription.pk, 0, 10)])
+        self.assertEqual(ai_requests_used(get_subscription_state(self.user)), 10)
+
+    def test_reconcile_drops_negative_counters(self):
+        subscription = Subscription.objects.get(user=self.user)
+        cache.set(pending_key(subscription.pk), -2, timeout=None)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            corrections = reconcile_usage()
+
+        self.assertIn((subscription.pk, -2, 0), corrections)
+        self.assertEqual(self.used(), 0)
+
+
+class BusinessStatsTests(TenantTestCase):
+    def place_order(self, product, quantity):
+        with self.captureOnCommitCallbacks(execute=True):
+            order = Order.objects.create(employee=self.user, amount=product.price * quantity)
+            OrderItem.objects.create(
+                order=order, product=product, product_title=product.title,
+                quantity=quantity, price=product.price,
+            )
+
+    def test_cache_miss_is_one_query(self):
+        with self.assertNumQueries(1):
+            stats = get_business_stats(self.user)
+        with self.assertNumQueries(0):
+            self.assertEqual(get_business_stats(self.user), stats)
+
+    def test_renamed_product_is_one_row_under_its_current_title(self):
+        product = Product.objects.filter(owner=self.user).first()
+        get_business_stats(self.user)
+        self.place_order(product, 1000)
+        Product.objects.filter(pk=product.pk).update(title="Renamed")
+        self.place_order(product, 1000)
+
+        folded = get_business_stats(self.user)
+        self.assertRegex(folded["top"], r"^Renamed \(\d+ sold\)")
+        self.assertNotIn(product.title, folded["top"])
+
+        cache.clear()
+        self.assertEqual(get_business_stats(self.user), folded)
+
+
+class BenchmarkTests(TenantTestCase):
+    databases = '__all__'
+
+    # The handler's connection cleanup would close the test transaction
+    @mock.patch.object(benchmarks, 'close_old_connections')
+    @mock.patch.object(benchmarks, 'gate_whitelist_overhead', return_value={})
+    def test_order_create_leaves_the_dataset_as_it_was(self, *mocks):
+        products = Product.objects.filter(owner=self.user).order_by('pk')
+        before = list(products.values_list('pk', 'stock', 'status'))
+        orders = Order.objects.count()
+
+        report = benchmarks.run_benchmarks(
+            [self.user], [], ['product_list', 'order_create'], iterations=3, dataset={},
+        )
+
+        for scenario in report['scenarios'].values():
+            self.assertEqual(scenario['errors'], 0)
+            self.assertEqual(set(scenario['queries']['by_alias']), set(connections))
+        self.assertEqual(list(products.values_list('pk', 'stock', 'status')), before)
+        self.assertEqual(Order.objects.count(), orders)
+
+
+@override_settings(REQUEST_METRICS_ENABLED=True)
+class RequestMetricsTests(TenantTestCase):
+    def setUp(self):
+        super().setUp()
+        route_metrics.reset()
+        self.addCleanup(route_metrics.reset)
+
+    def test_requests_are_labelled_by_view_name_and_timed(self):
+        response = self.client.get('/api/products/')
+
+        self.assertRegex(response['Server-Timing'], r'^db;dur=[\d.]+;desc="\d+ queries", view;dur=[\d.]+, total;dur=[\d.]+$')
+        summary = route_metrics.summary()
+        self.assertEqual(list(summary), ['GET product-list'])
+        timings = summary['GET product-list']
+        self.assertLessEqual(timings['view_ms']['p50'], timings['total_ms']['p50'])
+
+    def test_endpoint_reports_routes_and_assistant_cache(self):
+        self.client.get('/api/products/')
+        admin_user = User.objects.create_user('metrics-admin@flowmerce.local', 'pw', is_staff=True)
+        self.client.force_authenticate(admin_user)
+
+        data = self.client.get('/api/debug/metrics/').json()
+
+        self.assertIn('GET product-list', data['routes'])
+        self.assertEqual(data['assistant_cache'], {'hits': 0, 'misses': 0, 'size': 0})
+
+
+class SeedingTests(TenantTestCase):
+    def test_delete_seeded_removes_only_that_prefix(self):
+        models = [Product, Product.tags.through, Order, OrderItem, DailySalesRollup]
+        kept = [model.objects.count() for model in models]
+        seed_tenants('other-', tenants=2, products=5, orders=10, months=1)
+
+        delete_seeded('other-')
+
+        self.assertFalse(seeded_users('other-').exists())
+        self.assertEqual([model.objects.count() for model in models], kept)
+
+    def test_delete_seeded_keeps_real_rows_sharing_the_prefix(self):
+        seed_tenants('load-', tenants=1, products=2, orders=2, months=1)
+        real_user = User.objects.create_user('load-planning@acme.com', 'pw')
+        category = Category.objects.create(title="Load testing kits", slug='load-testing-kits')
+
+        delete_seeded('load-')
+
+        self.assertFalse(seeded_users('load-').exists())
+        self.assertTrue(User.objects.filter(pk=real_user.pk).exists())
+        self.assertTrue(Category.objects.filter(pk=category.pk).exists())
+
+    def test_replace_needs_an_explicit_prefix(self):
+        with self.assertRaisesMessage(CommandError, "--prefix"):
+            call_command('seed_load', '--replace', tenants=1, stdout=io.StringIO())
+
+
+class ProductImportTests(TenantTestCase):
+    def test_duplicate_skus_are_reported_as_skipped(self):
+        category = Category.objects.filter(products__owner=self.user).first()
+        upload = SimpleUploadedFile('products.csv', (
+            "sku,title,price,category\n"
+            f"DUP-1,First,10,{category.pk}\n"
+            f"NEW-1,Other,12,{category.pk}\n"
+            f"DUP-1,Second,11,{category.pk}\n"
+        ).encode())
+
+        report = self.client.post('/api/products/import/', {'file': upload}, format='multipart').json()
+
+        self.assertEqual(
+            {key: report[key] for key in ('processed', 'created', 'updated', 'failed', 'skipped')},
+            {'processed': 3, 'created': 2, 'updated': 0, 'failed': 0, 'skipped': 1},
+        )
+        self.assertEqual(report['duplicates'], [{'line': 2, 'sku': 'DUP-1', 'replaced_by': 4}])
+        self.assertEqual(Product.objects.get(owner=self.user, sku='DUP-1').title, "Second")
+
+
+class ConnectionPoolTests(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = lambda name: os.path.join(directory.name, name)
+
+    def wrapper(self, name='a.sqlite3', **pool):
+        # Throwaway SQLite files under their own alias, so its own pool
+        settings_dict = ConnectionHandler({
+            'default': {
+                'ENGINE': 'core.db_backends.sqlite3',
+                'NAME': self.path(name),
+                'POOL': {'MAX_SIZE': 2, 'TIMEOUT': 0, 'CHECK_AFTER': 0, **pool},
+            },
+        }).settings['default']
+        wrapper = load_backend(settings_dict['ENGINE']).DatabaseWrapper(settings_dict, 'pool-test')
+        self.addCleanup(wrapper.close)
+        return wrapper
+
+    def database_file(self, wrapper):
+        with wrapper.cursor() as cursor:
+            cursor.execute('PRAGMA database_list')
+            return cursor.fetchone()[2]
+
+    def test_closed_connections_are_reused(self):
+        wrapper = self.wrapper()
+        wrapper.ensure_connection()
+        raw = wrapper.connection
+        wrapper.close()
+
+        wrapper.ensure_connection()
+        self.assertIs(wrapper.connection, raw)
+        self.assertEqual(wrapper.pool.stats(), {'open': 1, 'idle': 0, 'max_size': 2})
+
+    def test_dead_idle_connections_are_replaced(self):
+        wrapper = self.wrapper()
+        wrapper.ensure_connection()
+        raw = wrapper.connection
+        wrapper.close()
+        raw.close()
+
+        with wrapper.cursor() as cursor:
+            cursor.execute('SELECT 1')
+        self.assertIsNot(wrapper.connection, raw)
+
+    def test_pool_follows_a_change_of_database(self):
+        wrapper = self.wrapper('a.sqlite3')
+        wrapper.ensure_connection()
+        old_pool = wrapper.pool
+        wrapper.close()
+
+        # What the test runner does when it creates the test database
+        wrapper.settings_dict['NAME'] = self.path('b.sqlite3')
+        self.assertEqual(self.database_file(wrapper), self.path('b.sqlite3'))
+        self.assertIsNot(wrapper.pool, old_pool)
+        self.assertEqual(old_pool.stats()['open'], 0)
+
+    def test_waits_are_bounded_by_max_size(self):
+        first, second = self.wrapper(MAX_SIZE=1), self.wrapper(MAX_SIZE=1)
+        first.ensure_connection()
+        with self.assertRaises(PoolExhausted):
+            second.ensure_connection()
+
+        first.close()
+        second.ensure_connection()
+
+
+@override_settings(CACHES=LOCAL_CACHES)
+class ReplicaRoutingTests(TransactionTestCase):
+    # Routing decisions only; no query reaches the replica alias
+    def setUp(self):
+        cache.clear()
+        for module in (db_routers, replica_middleware):
+            patcher = mock.patch.object(module, 'replica_configured', return_value=True)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.user = User(pk=1, email='writer@example.com')
+
+    def test_reads_use_the_replica_only_when_asked(self):
+        self.assertEqual(router.db_for_read(Product), 'default')
+        with replica_reads(self.user):
+            self.assertEqual(router.db_for_read(Product), REPLICA)
+            self.assertEqual(router.db_for_write(Product), 'default')
+        self.assertEqual(router.db_for_read(Product), 'default')
+
+    def test_recent_writers_read_their_writes_from_the_primary(self):
+        pin_to_primary(self.user)
+        with replica_reads(self.user):
+            self.assertEqual(router.db_for_read(Product), 'default')
+        with replica_reads(User(pk=2)):
+            self.assertEqual(router.db_for_read(Product), REPLICA)
+
+    def test_reads_inside_a_transaction_stay_on_the_primary(self):
+        with replica_reads(self.user), transaction.atomic():
+            self.assertEqual(router.db_for_read(Product), 'default')
+
+    def test_lookup_tables_load_from_the_primary(self):
+        category = Category.objects.create(title="Tools", slug="tools")
+        category_table.clear()
+        # The replica alias doesn't exist here, so routing there would fail
+        with replica_reads(self.user):
+            self.assertEqual(category_table.get(category.pk).title, "Tools")
+
+    def test_unsafe_requests_pin_the_user(self):
+        middleware = ReadYourWritesMiddleware(lambda request: HttpResponse())
+        for method, pinned in [('get', False), ('post', True)]:
+            request = getattr(RequestFactory(), method)('/api/orders/')
+            request.user = self.user
+            middleware(request)
+            self.assertEqual(is_pinned(self.user), pinned, method)
+
+
+@skipUnless(REPLICA in connections, "needs a replica database, e.g. DB_REPLICA_ENGINE/DB_REPLICA_NAME")
+@override_settings(CACHES=LOCAL_CACHES)
+class ReplicaQueryTests(TransactionTestCase):
+    databases = '__all__'
+
+    def setUp(self):
+        cache.clear()
+        for table in lookup_tables.values():
+            table.clear()
+        seed_tenants('replica-', tenants=1, products=5, orders=5, months=1)
+        self.user = seeded_users('replica-').get()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def queries_by_alias(self, path):
+        with benchmarks.capture_queries() as captured:
+            self.assertEqual(self.client.get(path).status_code, 200)
+        return {alias: len(context) for alias, context in captured.items()}
+
+    def test_lists_read_from_the_replica(self):
+        counts = self.queries_by_alias('/api/products/')
+        self.assertGreater(counts[REPLICA], 0)
+
+    def test_cache_fills_and_pinned_users_read_from_the_primary(self):
+        self.assertEqual(self.queries_by_alias('/api/analytics/summary/')[REPLICA], 0)
+
+        pin_to_primary(self.user)
+        self.assertEqual(self.queries_by_alias('/api/products/')[REPLICA], 0)
+
+
+class ConditionalListTests(TenantTestCase):
+    def test_unchanged_list_revalidates_with_304(self):
+        response = self.client.get('/api/products/')
+        etag = response.headers['ETag']
+        self.assertNotIn('Last-Modified', response.headers)
+
+        with self.assertNumQueries(0):
+            response = self.client.get('/api/products/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+    def test_back_to_back_writes_each_change_the_etag(self):
+        # Within one second; a whole-second Last-Modified can't tell them apart
+        etags = [self.client.get('/api/products/').headers['ETag']]
+        product = Product.objects.filter(owner=self.user).first()
+        for _ in range(2):
+            with self.captureOnCommitCallbacks(execute=True):
+                product.save()
+            response = self.client.get('/api/products/', HTTP_IF_NONE_MATCH=etags[-1])
+            self.assertEqual(response.status_code, 200)
+            etags.append(response.headers['ETag'])
+        self.assertEqual(len(set(etags)), 3)
+
+    def test_scopes_are_required(self):
+        with self.assertRaises(AssertionError):
+            ConditionalListMixin().get_catalog_scopes()
+
+
+class LookupTableTests(TenantTestCase):
+    def test_rows_are_handed_out_as_copies(self):
+        category = Category.objects.first()
+        first = category_table.get(category.pk)
+        first.title = "Changed by a caller"
+
+        with self.assertNumQueries(0):
+            second = category_table.get(category.pk)
+        self.assertIsNot(second, first)
+        self.assertEqual(second.title, category.title)
+
+
+class BlockAllocatorTests(TestCase):
+    def allocator(self, **kwargs):
+        return BlockAllocator('test_sequence', block_size=5, **kwargs)
+
+    def test_rolled_back_reservation_is_handed_out_again(self):
+        allocator = self.allocator()
+        try:
+            with transaction.atomic():
+                first = allocator.allocate()
+                raise RuntimeError
+        except RuntimeError:
+            pass
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(allocator.allocate(), first)
+        self.assertEqual(allocator.allocate(), first + 1)
+
+    def test_forked_process_reserves_its_own_block(self):
+        parent = self.allocator()
+        with self.captureOnCommitCallbacks(execute=True):
+            first = parent.allocate()
+        self.assertEqual(parent.allocate(), first + 1)
+
+        # The parent's remaining first+2..first+4 may still be served there
+        with mock.patch('core.sequences.os.getpid', return_value=-1):
+            self.assertEqual(parent.allocate(), first + 5)
+
+    def test_workers_never_share_a_number(self):
+        workers = [self.allocator(), self.allocator(), self.allocator()]
+        numbers = []
+        for _ in range(12):
+            for worker in workers:
+                with self.captureOnCommitCallbacks(execute=True):
+                    numbers.append(worker.allocate())
+        self.assertEqual(len(set(numbers)), len(numbers))
+
+
+class ConcurrentOrderNumberTests(TransactionTestCase):
+    def setUp(self):
+        # SQLite serializes writers only with a file and IMMEDIATE transactions
+        if connection.vendor == 'sqlite' and (
+            connection.is_in_memory_db()
+            or connection.settings_dict['OPTIONS'].get('transaction_mode') != 'IMMEDIATE'
+        ):
+            self.skipTest("needs a database that takes concurrent writers")
+
+    def test_concurrent_orders_get_distinct_numbers(self):
+        seed_tenants('numbers-', tenants=1, products=3, orders=0, months=1)
+        user = seeded_users('numbers-').get()
+        lines = [{'product': product, 'quantity': 1} for product in Product.objects.filter(owner=user)]
+        numbers, errors = [], []
+
+        def place_orders():
+            try:
+                for _ in range(10):
+                    numbers.append(create_order(user, lines).number)
+            except Exception as error:
+                errors.append(error)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=place_orders) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        self.assertEqual(len(numbers), 40)
+        self.assertEqual(len(set(numbers)), 40)
+
+
+class StockReservationTests(TenantTestCase):
+    def setUp(self):
+        super().setUp()
+        self.product = Product.objects.filter(owner=self.user).first()
+
+    def set_stock(self, stock):
+        Product.objects.filter(pk=self.product.pk).update(stock=stock, status='available')
+
+    def order(self, quantity):
+        return self.client.post(
+            '/api/orders/',
+            {'status': Order.COMPLETED, 'items': [{'product': self.product.pk, 'quantity': quantity}]},
+            format='json',
+        )
+
+    def test_oversold_line_is_reported(self):
+        self.set_stock(3)
+        with self.assertLogs('core.stock', 'WARNING'):
+            response = self.order(5)
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(
+            response.data['oversold'], [{'product': self.product.pk, 'requested': 5, 'available': 3}],
+        )
+        self.product.refresh_from_db()
+        self.assertEqual((self.product.stock, self.product.status), (0, 'out_of_stock'))
+
+    def test_out_of_stock_line_is_reported(self):
+        self.set_stock(0)
+        with self.assertLogs('core.stock', 'WARNING'):
+            response = self.order(1)
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['oversold'][0]['available'], 0)
+
+    def test_stocked_order_reports_nothing(self):
+        self.set_stock(5)
+        response = self.order(2)
+
+        self.assertEqual(response.data['oversold'], [])
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock, 3)
+
+    def test_item_handler_rolls_back_when_stock_fails(self):
+        order = Order.objects.filter(employee=self.user).first()
+        items = order.items.count()
+
+        with mock.patch.object(views, 'reserve_stock', side_effect=RuntimeError), \
+                self.assertRaises(RuntimeError):
+            self.client.post(
+                f'/api/orders/{order.pk}/items/', {'product': self.product.pk, 'quantity': 1}, format='json',
+            )
+        self.assertEqual(order.items.count(), items)
+
+    def test_admin_added_items_reserve_stock(self):
+        self.set_stock(5)
+        request = RequestFactory().post('/admin/')
+        request.user = self.user
+        request.session = {}
+        request._messages = FallbackStorage(request)
+        item = OrderItem(
+            order=Order.objects.filter(employee=self.user).first(),
+            product=self.product, quantity=2, price=self.product.price,
+        )
+
+        OrderItemAdmin(OrderItem, admin.site).save_model(request, item, None, change=False)
+
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock, 3)
+
+
+class RollupTests(TenantTestCase):
+    def setUp(self):
+        super().setUp()
+        self.order = Order.objects.filter(employee=self.user, status=Order.COMPLETED).first()
+
+    def rollups(self):
+        return list(
+            DailySalesRollup.objects.filter(employee=self.user, order_count__gt=0)
+            .order_by('day')
+            .values('day', 'revenue', 'order_count', 'pending_count', 'completed_count', 'cancelled_count')
+        )
+
+    def day(self, when):
+        return DailySalesRollup.objects.get(employee=self.user, day=rollup_day(when))
+
+    def assertRollupsMatchOrders(self):
+        incremental = self.rollups()
+        backfill([self.user])
+        self.assertEqual(incremental, self.rollups())
+
+    def test_changed_total_moves_revenue(self):
+        before = self.day(self.order.created_at).revenue
+        self.order.amount += 500
+        self.order.save()
+
+        self.assertEqual(self.day(self.order.created_at).revenue, before + 500)
+        self.assertRollupsMatchOrders()
+
+    def test_changed_status_moves_the_status_counts(self):
+        before = self.day(self.order.created_at)
+        self.order.status = Order.CANCELLED
+        self.order.save(update_fields=['status'])
+
+        after = self.day(self.order.created_at)
+        self.assertEqual(after.completed_count, before.completed_count - 1)
+        self.assertEqual(after.cancelled_count, before.cancelled_count + 1)
+        self.assertEqual(after.order_count, before.order_count)
+        self.assertRollupsMatchOrders()
+
+    def test_changed_date_moves_the_order_between_days(self):
+        old_day = self.order.created_at
+        new_day = old_day - timedelta(days=40)
+        before = self.day(old_day)
+
+        self.order.created_at = new_day
+        self.order.save()
+
+        self.assertEqual(self.day(old_day).order_count, before.order_count - 1)
+        self.assertEqual(self.day(new_day).order_count, 1)
+        self.assertEqual(self.day(new_day).revenue, self.order.amount)
+        self.assertRollupsMatchOrders()
+
+    def test_deleted_order_is_removed(self):
+        before = self.day(self.order.created_at)
+        self.order.delete()
+
+        after = self.day(self.order.created_at)
+        self.assertEqual(after.order_count, before.order_count - 1)
+        self.assertEqual(after.revenue, before.revenue - self.order.amount)
+        self.assertRollupsMatchOrders()
+
+    def test_stale_instance_removes_what_was_stored(self):
+        stale = Order.objects.get(pk=self.order.pk)
+        self.order.amount += 300
+        self.order.save()
+
+        stale.delete()
+        self.assertRollupsMatchOrders()
+
+    def test_unrelated_update_costs_no_rollup_queries(self):
+        with self.assertNumQueries(1):
+            self.order.save(update_fields=['updated_at'])
+
+
+class CursorPaginationTests(TenantTestCase):
+    def test_pages_cover_rows_sharing_a_timestamp_once(self):
+        # Bulk-created orders share one created_at
+        Order.objects.filter(employee=self.user).update(created_at=timezone.now())
+        expected = set(Order.objects.filter(employee=self.user).values_list('id', flat=True))
+
+        seen = []
+        url = '/api/orders/?view=summary&pagination=cursor&page_size=7'
+        while url:
+            page = self.client.get(url).data
+            seen.extend(order['id'] for order in page['results'])
+            url = page['next']
+        self.assertEqual(sorted(seen), sorted(expected))
@@ -18,9 +18,10 @@ from .views import (
     order_items_handler,
     analytics_summary,
     monthly_sales,
+    request_metrics,
     show_all_urls  # Add this
 )
-from .views_ai import FlowmerceAssistantView
+from .views_ai import FlowmerceAssistantView, FlowmerceAssistantStreamView
 
 router = DefaultRouter()
 router.register(r'products', ProductViewSet, basename='product')
@@ -32,6 +33,7 @@ urlpatterns = [
     path("orders/<int:order_id>/items/", order_items_handler, name="order-items-handler"),
     path("users/me/", CurrentUserView.as_view(), name="current-user"),
     path('assistant/', FlowmerceAssistantView.as_view(), name='flowmerce-assistant'),
+    path('assistant/stream/', FlowmerceAssistantStreamView.as_view(), name='flowmerce-assistant-stream'),
     path('analytics/summary/', analytics_summary, name='analytics-summary'),
     path('analytics/monthly-sales/', monthly_sales, name='monthly-sales'),
     path('payments/request/', PaymentRequestCreateView.as_view(), name='payment-request'),
@@ -46,6 +48,7 @@ urlpatterns = [
     # path('orders/create/', OrderCreateView.as_view(), name='order-create'),
     # path('orders/<int:pk>/', OrderDetailView.as_view(), name='order-detail'),
     path('debug/urls/', show_all_urls, name='debug-urls'),  # Add name for reference
+    path('debug/metrics/', request_metrics, name='request-metrics'),
 ] + static(settings.STATIC_URL, document_root=settings.STATIC_ROOT)
 urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
 
@@ -1,16 +1,18 @@
 from rest_framework.views import APIView
 from rest_framework.decorators import api_view, permission_classes
-from django.db.models import Sum, Avg, Count
+from django.db.models import Sum
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework import status, permissions, viewsets
 from rest_framework.permissions import IsAdminUser
-from rest_framework.pagination import PageNumberPagination
+from rest_framework.pagination import PageNumberPagination, CursorPagination
 from .permissions import IsAdminUser, IsAdminOrReadOnly, HasActiveSubscription, IsAdminUser
 from rest_framework.permissions import IsAuthenticated
 from rest_framework import parsers, generics
 import logging
+from django.db import transaction
 from django.shortcuts import get_object_or_404
+from django.http import StreamingHttpResponse
 import requests
 from django.conf import settings
 from django.db.models.functions import TruncMonth
@@ -19,8 +21,15 @@ logger = logging.getLogger(__name__)
 from rest_framework_simplejwt.tokens import RefreshToken
 from django.contrib.auth import authenticate
 from django.utils.text import slugify
-from .models import User, Product, Order, OrderItem, Category, Tag, PaymentRequest, Subscription
-from .serializers import UserSerializer, ProductSerializer, OrderSerializer, OrderItemSerializer, CategorySerializer, TagSerializer, PaymentRequestCreateSerializer, SubscriptionSerializer
+from .models import User, Product, Order, OrderItem, Category, Tag, PaymentRequest, Subscription, DailySalesRollup
+from .stock import reserve_stock
+from .analytics import get_summary
+from .db_routers import ReplicaListMixin, reads_from_replica
+from .catalog import CATEGORIES, TAGS, ConditionalListMixin
+from .product_io import FORMATS, detect_format, export_products, import_products
+from .middleware.instrumentation import route_metrics
+from .assistant_cache import response_cache
+from .serializers import UserSerializer, ProductSerializer, OrderSerializer, OrderListSerializer, OrderItemSerializer, CategorySerializer, TagSerializer, PaymentRequestCreateSerializer, SubscriptionSerializer
 
 def verify_recaptcha(token):
     """Verify Google reCAPTCHA v2 token with Google's API."""
@@ -42,6 +51,39 @@ class CustomPagination(PageNumberPagination):
     page_size_query_param = 'page_size'
     max_page_size = 100
 
+
+class CreatedAtCursorPagination(CursorPagination):
+    """
+    Cursor pagination ordered by (created_at, id), with no COUNT(*) query.
+    DRF keys the cursor on created_at alone: a page seeks to the last
+    timestamp seen through the tenant (owner/employee, created_at) index,
+    then skips the rows sharing that timestamp with an offset. Cost is
+    stable at any depth unless many rows share one created_at. id only
+    makes the order deterministic within such a run.
+    """
+    ordering = ('-created_at', '-id')
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+
+
+class SelectablePaginationMixin:
+    """
+    Lets clients opt into cursor pagination per request with
+    ?pagination=cursor (follow-up pages carry a ?cursor= token).
+    Page-number pagination stays the default.
+    """
+    cursor_pagination_class = CreatedAtCursorPagination
+
+    def uses_cursor_pagination(self):
+        params = self.request.query_params
+        return params.get('pagination') == 'cursor' or 'cursor' in params
+
+    @property
+    def paginator(self):
+        if not hasattr(self, '_paginator') and self.uses_cursor_pagination():
+            self._paginator = self.cursor_pagination_class()
+        return super().paginator
+
 class CurrentUserView(APIView):
     permission_classes = [IsAuthenticated]
 
@@ -141,29 +183,73 @@ class IsOwnerOrReadOnly(permissions.BasePermission):
         return obj.owner == request.user
 
 
-class ProductViewSet(viewsets.ModelViewSet):
+class ProductViewSet(ConditionalListMixin, ReplicaListMixin, SelectablePaginationMixin, viewsets.ModelViewSet):
     parser_classes = [parsers.MultiPartParser, parsers.JSONParser]
     serializer_class = ProductSerializer
     pagination_class = CustomPagination
     permission_classes = [permissions.IsAuthenticated, IsOwnerOrReadOnly, HasActiveSubscription]
 
     def get_queryset(self):
-        # Only return products owned by the logged-in user
-        return Product.objects.filter(owner=self.request.user)
+        # Only return products owned by the logged-in user. Categories come
+        # from core.catalog's in-memory table, tags in one query per page.
+        return (
+            Product.objects.filter(owner=self.request.user)
+            .select_related('owner')
+            .prefetch_related('tags')
+        )
+
+    def get_catalog_scopes(self):
+        return [self.request.user.pk, CATEGORIES, TAGS]
 
     def perform_create(self, serializer):
         # Automatically set the owner to the logged-in user
         serializer.save(owner=self.request.user)
+
+    @action(detail=False, methods=['post'], url_path='import', parser_classes=[parsers.MultiPartParser])
+    def bulk_import(self, request):
+        """Create or update products by sku from an uploaded CSV or JSON Lines file"""
+        upload = request.FILES.get('file')
+        if upload is None:
+            return Response({'error': 'Upload a CSV or JSON Lines file as "file".'}, status=status.HTTP_400_BAD_REQUEST)
+
+        fmt = detect_format(upload, request.data.get('type'))
+        if fmt is None:
+            return Response({'error': 'Unsupported file type; use csv or jsonl.'}, status=status.HTTP_400_BAD_REQUEST)
+
+        return Response(import_products(request.user, upload, fmt))
+
+    @action(detail=False, methods=['get'], url_path='export')
+    def export(self, request):
+        """Stream the user's products as CSV, or JSON Lines with ?type=jsonl"""
+        fmt = request.query_params.get('type', 'csv').lower()
+        if fmt not in FORMATS:
+            return Response({'error': 'Unsupported file type; use csv or jsonl.'}, status=status.HTTP_400_BAD_REQUEST)
+
+        response = StreamingHttpResponse(export_products(request.user, fmt), content_type=FORMATS[fmt])
+        response['Content-Disposition'] = f'attachment; filename="products.{fmt}"'
+        return response
    
 
 
-class OrderViewSet(viewsets.ModelViewSet):
+class OrderViewSet(ReplicaListMixin, SelectablePaginationMixin, viewsets.ModelViewSet):
     serializer_class = OrderSerializer
     permission_classes = [permissions.IsAuthenticated, HasActiveSubscription]
 
+    def is_summary_list(self):
+        # ?view=summary lists orders without their items
+        return self.action == 'list' and self.request.query_params.get('view') == 'summary'
+
     def get_queryset(self):
         # Only show orders belonging to the logged-in user
-        return Order.objects.filter(employee=self.request.user)
+        queryset = Order.objects.filter(employee=self.request.user).select_related('employee')
+        if self.is_summary_list():
+            return queryset
+        return queryset.prefetch_related('items')
+
+    def get_serializer_class(self):
+        if self.is_summary_list():
+            return OrderListSerializer
+        return super().get_serializer_class()
 
     def get_serializer_context(self):
         context = super().get_serializer_context()
@@ -176,10 +262,11 @@ class OrderViewSet(viewsets.ModelViewSet):
 
 
 
-class CategoryViewSet(viewsets.ModelViewSet):
+class CategoryViewSet(ConditionalListMixin, viewsets.ModelViewSet):
     queryset = Category.objects.all()
     serializer_class = CategorySerializer
     permission_classes = [IsAdminOrReadOnly]
+    catalog_scopes = [CATEGORIES]
 
     def perform_create(self, serializer):
         # Auto-generate slug if not provided
@@ -187,10 +274,11 @@ class CategoryViewSet(viewsets.ModelViewSet):
             serializer.validated_data['slug'] = slugify(serializer.validated_data['title'])
         serializer.save()
 
-class TagViewSet(viewsets.ModelViewSet):
+class TagViewSet(ConditionalListMixin, viewsets.ModelViewSet):
     queryset = Tag.objects.all()
     serializer_class = TagSerializer  
     permission_classes = [IsAdminOrReadOnly]
+    catalog_scopes = [TAGS]
 
 from django.http import JsonResponse
 from django.urls import get_resolver
@@ -210,53 +298,48 @@ def show_all_urls(request):
     collect_urls(resolver.url_patterns)
     return JsonResponse({'urls': url_list})
 
+@api_view(['GET', 'DELETE'])
+@permission_classes([permissions.IsAdminUser])
+def request_metrics(request):
+    """
+    Per-route p50/p95/p99 of this worker's recent requests, and its
+    assistant answer cache hit rate; DELETE resets the route metrics
+    """
+    if request.method == 'DELETE':
+        route_metrics.reset()
+        return Response(status=status.HTTP_204_NO_CONTENT)
+    return Response({
+        'enabled': settings.REQUEST_METRICS_ENABLED,
+        'routes': route_metrics.summary(),
+        'assistant_cache': response_cache.stats(),
+    })
+
 @api_view(['GET'])
 @permission_classes([permissions.IsAuthenticated, HasActiveSubscription])
 def analytics_summary(request):
-    total_orders = Order.objects.filter(employee=request.user).count()
-    total_revenue = Order.objects.filter(employee=request.user).aggregate(total=Sum('amount'))['total'] or 0
-    avg_order_value = Order.objects.filter(employee=request.user).aggregate(avg=Avg('amount'))['avg'] or 0
-    total_products = Product.objects.filter(owner=request.user).count()
-
-    top_products = (
-        OrderItem.objects.filter(order__employee=request.user)
-        .values('product__title')
-        .annotate(total_sold=Sum('quantity'))
-        .order_by('-total_sold')[:5]
-    )
-
-    status_counts = (
-        Order.objects.filter(employee=request.user)
-        .values('status')
-        .annotate(count=Count('status'))
-    )
-
-    return Response({
-        "total_orders": total_orders,
-        "total_revenue": total_revenue,
-        "avg_order_value": avg_order_value,
-        "total_products": total_products,
-        "top_products": top_products,
-        "status_counts": status_counts,
-    })
+    # Served from a per-user cache that order and product writes invalidate.
+    # Rebuilt from the primary: a lagging replica would re-cache stale totals.
+    return Response(get_summary(request.user))
 
 
 @api_view(['GET'])
 @permission_classes([permissions.IsAuthenticated, HasActiveSubscription])
+@reads_from_replica
 def monthly_sales(request):
     year = request.GET.get('year')
-    queryset = Order.objects.filter(employee=request.user)
+    # Pre-aggregated per day by core.rollups; never scans the order table
+    queryset = DailySalesRollup.objects.filter(employee=request.user, order_count__gt=0)
 
     if year:
-        queryset = queryset.filter(created_at__year=year)
+        queryset = queryset.filter(day__year=year)
 
     sales_data = (
         queryset
-        .annotate(month=TruncMonth('created_at'))
+        .annotate(month=TruncMonth('day'))
         .values('month')
         .annotate(
-            total_revenue=Sum('amount'),
-            total_orders=Count('id'),
+            total_revenue=Sum('revenue'),
+            total_orders=Sum('order_count'),
         )
         .order_by('month')
     )
@@ -295,19 +378,22 @@ def order_items_handler(request, order_id):
 
         product = serializer.validated_data["product"]
 
-        item = serializer.save(
-            order=order,
-            price=product.price,
-            product_title=product.title,
-            product_price=product.price,
-            product_sku=product.sku,
-        )
+        # The item, its stock and the new total land together or not at all
+        with transaction.atomic():
+            item = serializer.save(
+                order=order,
+                price=product.price,
+                product_title=product.title,
+                product_price=product.price,
+                product_sku=product.sku,
+            )
+            oversold = reserve_stock([item])
 
-        order.amount = sum(i.total_price for i in order.items.all())
-        order.save(update_fields=["amount"])
+            order.amount = sum(i.total_price for i in order.items.all())
+            order.save(update_fields=["amount"])
 
         return Response(
-            OrderItemSerializer(item).data,
+            {**OrderItemSerializer(item).data, "oversold": oversold},
             status=status.HTTP_201_CREATED
         )
 
@@ -1,107 +1,66 @@
-from django.http import StreamingHttpResponse
-from django.utils import timezone
+import asyncio
+import logging
+import weakref
+
+from django.core.handlers.asgi import ASGIRequest
+from django.http import StreamingHttpResponse, JsonResponse
+from django.utils.decorators import method_decorator
+from django.views import View
+from django.views.decorators.csrf import csrf_exempt
+from django.conf import settings
 from rest_framework.views import APIView
-from django.db.models import Sum
-from django.core.cache import cache
-from .models import Order, OrderItem
+from asgiref.sync import sync_to_async
 from rest_framework.permissions import IsAuthenticated
+from rest_framework.exceptions import AuthenticationFailed, NotAuthenticated
+from rest_framework_simplejwt.authentication import JWTAuthentication
 from .permissions import CanUseAI
+from .subscriptions import subscription_state_for
+from .assistant_cache import response_cache, replay_chunks
+from .metering import record_ai_request, ai_requests_used
+from .business_stats import get_business_stats
 import requests, json, traceback
+import httpx
 from rest_framework.response import Response
 from rest_framework import status
 
 
-class FlowmerceAssistantView(APIView):
-    permission_classes = [IsAuthenticated, CanUseAI]
-
-    def get_business_stats(self, user):
-        cache_key = f"business_stats_{user.id}"
-        cached = cache.get(cache_key)
-        if cached:
-            return cached
-
-        today = timezone.now()
-        month_start = today.replace(day=1)
-
-        month_orders = Order.objects.filter(employee=user, created_at__gte=month_start)
-
-        revenue = month_orders.aggregate(total=Sum("amount"))["total"] or 0
-        order_count = month_orders.count()
-
-        top_qs = (
-            OrderItem.objects.filter(
-                order__employee=user, order__created_at__gte=month_start
-            )
-            .values("product__title")
-            .annotate(total_sold=Sum("quantity"))
-            .order_by("-total_sold")[:5]
-        )
+logger = logging.getLogger(__name__)
 
-        top = (
-            ", ".join(f"{p['product__title']} ({p['total_sold']} sold)" for p in top_qs)
-            if top_qs.exists()
-            else "No sales data available yet."
-        )
+OLLAMA_GENERATE_URL = f"{settings.OLLAMA_URL.rstrip('/')}/api/generate"
 
-        stats = {
-            "revenue": revenue,
-            "orders": order_count,
-            "top": top,
-        }
 
-        cache.set(cache_key, stats, timeout=1800)
-        return stats
+def plan_denial(request):
+    """
+    Return the message explaining why the user's plan cannot use the
+    assistant, or None if the request may go ahead. Admins are always allowed.
+    """
+    if request.user.is_staff or request.user.is_superuser:
+        return None
 
-    def post(self, request):
-        print("⚡ [Flowmerce AI] Fast request received")
-        # Admin always allowed
-        if request.user.is_staff or request.user.is_superuser:
-            subscription = None
-        else:
-            try:
-                subscription = request.user.subscription
-            except:
-                return Response(
-                {"message": "You need an active subscription to use the AI assistant."},
-                status=status.HTTP_403_FORBIDDEN,
-                )
+    subscription = subscription_state_for(request)
+    if subscription is None:
+        return "You need an active subscription to use the AI assistant."
 
-            if subscription.status != "active":
-                return Response(
-                    {"message": "Your subscription is not active."},
-                    status=status.HTTP_403_FORBIDDEN,
-                )
+    if not subscription.is_active():
+        return "Your subscription is not active."
 
-            plan_code = subscription.plan.code.lower()
+    plan_code = subscription.plan_code
 
-            if plan_code == "basic":
-                return Response(
-                    {
-                        "message": "🚀 The AI assistant is available on Pro and Premium plans. Please upgrade to use it."
-                    },
-                    status=status.HTTP_403_FORBIDDEN,
-                )
+    if plan_code == "basic":
+        return "🚀 The AI assistant is available on Pro and Premium plans. Please upgrade to use it."
 
-            if plan_code == "pro" and subscription.ai_requests_used >= 50:
-                return Response(
-                    {
-                        "message": "You’ve reached your monthly AI limit (50 requests). Upgrade to Premium for unlimited access."
-                    },
-                    status=status.HTTP_403_FORBIDDEN,
-                )
+    if plan_code == "pro" and ai_requests_used(subscription) >= 50:
+        return "You’ve reached your monthly AI limit (50 requests). Upgrade to Premium for unlimited access."
 
+    return None
 
-        try:
-            user_message = request.data.get("message", "").strip()
-
-            # Load cached business stats (fixed 1 DB hit if cache expired)
-            stats = self.get_business_stats(request.user)
 
-            formatted_revenue = f"**KES {stats['revenue']:,.0f}**"
-            formatted_orders = f"**{stats['orders']}**"
+def build_payload(stats, user_message):
+    formatted_revenue = f"**KES {stats['revenue']:,.0f}**"
+    formatted_orders = f"**{stats['orders']}**"
 
-            # ULTRA-short prompt = super fast generation
-            prompt = f"""
+    # ULTRA-short prompt = super fast generation
+    prompt = f"""
 Flowmerce AI:
 
 • Orders this month: {formatted_orders}
@@ -112,58 +71,108 @@ Reply clearly, briefly, and professionally.
 User: {user_message}
 """
 
-            payload = {
-                "model": "phi3:mini",
-                "prompt": prompt.strip(),
-                "stream": True,
-                "options": {
-                    "temperature": 0.25,
-                    "top_p": 0.9,
-                    "top_k": 40,
-                    "num_predict": 180,
-                    "num_ctx": 512,
-                    "repeat_penalty": 1.05,
-                    "stop": ["User:", "Flowmerce AI:", "\n\n"],
-                    "seed": 3,
-                },
-            }
+    return {
+        "model": "phi3:mini",
+        "prompt": prompt.strip(),
+        "stream": True,
+        "options": {
+            "temperature": 0.25,
+            "top_p": 0.9,
+            "top_k": 40,
+            "num_predict": 180,
+            "num_ctx": 512,
+            "repeat_penalty": 1.05,
+            "stop": ["User:", "Flowmerce AI:", "\n\n"],
+            "seed": 3,
+        },
+    }
+
+
+def parse_frame(raw):
+    """
+    The generated text of one NDJSON line of an Ollama stream, and whether
+    it is the final frame ("done": true) that ends a complete answer.
+    """
+    if not raw:
+        return "", False
+    try:
+        frame = json.loads(raw)
+        return frame.get("response", ""), frame.get("done") is True
+    except (ValueError, AttributeError):
+        return "", False
+
+
+def cached_stream_response(chunks):
+    response = StreamingHttpResponse(chunks, content_type="text/plain; charset=utf-8")
+    response["X-Assistant-Cache"] = "hit"
+    return response
+
+
+class FlowmerceAssistantView(APIView):
+    permission_classes = [IsAuthenticated, CanUseAI]
+
+    def get_business_stats(self, user):
+        return get_business_stats(user)
+
+    def post(self, request):
+        print("⚡ [Flowmerce AI] Fast request received")
+        denial = plan_denial(request)
+        if denial:
+            return Response({"message": denial}, status=status.HTTP_403_FORBIDDEN)
+
+        try:
+            user_message = request.data.get("message", "").strip()
+
+            # Cached business stats, kept current by order write events
+            stats = self.get_business_stats(request.user)
+            payload = build_payload(stats, user_message)
+
+            cache_key = response_cache.key(user_message, stats, payload)
+            cached = response_cache.get(cache_key)
+            if cached is not None:
+                def replay():
+                    yield "\u200b"
+                    record_ai_request(request.user)
+                    yield from replay_chunks(cached)
+
+                return cached_stream_response(replay())
 
             session = requests.post(
-                "http://localhost:11434/api/generate",
+                OLLAMA_GENERATE_URL,
                 json=payload,
                 stream=True,
                 timeout=60,
             )
+            if not session.ok:
+                # e.g. 404 for an unknown model; answered by the handler below
+                session.close()
+                session.raise_for_status()
 
             def stream():
                 yield "\u200b"
 
-                # increment AI usage
-                try:
-                    sub = request.user.subscription
-                    if sub.plan.code == "pro":
-                        sub.ai_requests_used += 1
-                        sub.save(update_fields=["ai_requests_used"])
-                except:
-                    pass
-
+                chunks = []
+                done = False
                 try:
                     for raw in session.iter_lines(
                         decode_unicode=False, delimiter=b"\n"
                     ):
-
-                        if not raw:
-                            continue
-                        try:
-                            data = json.loads(raw.decode("utf-8"))
-                            text = data.get("response", "")
-                            if text:
-                                yield text
-                        except:
-                            continue
+                        text, done = parse_frame(raw)
+                        if text:
+                            if not chunks:
+                                # Metered once the model has answered
+                                record_ai_request(request.user)
+                            chunks.append(text)
+                            yield text
                 except Exception as e:
                     print("❌ Streaming crash:", e)
                     yield "\n⚠️ Streaming error."
+                else:
+                    # Only complete answers are replayed
+                    if done and chunks:
+                        response_cache.set(cache_key, "".join(chunks))
+                finally:
+                    session.close()
 
             return StreamingHttpResponse(
                 stream(), content_type="text/plain; charset=utf-8"
@@ -177,3 +186,136 @@ User: {user_message}
                 content_type="text/plain",
                 status=500,
             )
+
+
+# event loop -> its httpx.AsyncClient
+_ollama_clients = weakref.WeakKeyDictionary()
+
+
+def get_ollama_client():
+    """
+    Async HTTP client shared by the assistant streams on the running event
+    loop, so under ASGI they reuse pooled keep-alive connections to Ollama.
+    Pooled connections belong to the loop that opened them; under WSGI
+    each request runs on a short-lived loop of its own, and gets its own
+    client.
+    """
+    loop = asyncio.get_running_loop()
+    client = _ollama_clients.get(loop)
+    if client is None or client.is_closed:
+        client = _ollama_clients[loop] = httpx.AsyncClient(
+            timeout=httpx.Timeout(60, connect=5),
+            limits=httpx.Limits(
+                max_connections=settings.OLLAMA_MAX_CONNECTIONS,
+                max_keepalive_connections=settings.OLLAMA_MAX_CONNECTIONS,
+            ),
+        )
+    return client
+
+
+@method_decorator(csrf_exempt, name="dispatch")
+class FlowmerceAssistantStreamView(View):
+    """
+    Async variant of FlowmerceAssistantView for ASGI deployments (see
+    flowmerce/asgi.py). Waiting on Ollama does not hold a worker thread, so
+    one process can serve many concurrent assistant streams.
+    """
+    authentication = JWTAuthentication()
+    permission = CanUseAI()
+
+    def authorize(self, request):
+        # Same JWT authentication and CanUseAI checks as the DRF view
+        try:
+            result = self.authentication.authenticate(request)
+            if result is None:
+                raise NotAuthenticated()
+        except AuthenticationFailed as exc:
+            # Includes simplejwt's InvalidToken, with its own detail and code
+            detail = exc.detail if isinstance(exc.detail, dict) else {"detail": exc.detail}
+            response = JsonResponse(detail, status=status.HTTP_401_UNAUTHORIZED)
+            response["WWW-Authenticate"] = self.authentication.authenticate_header(request)
+            return response
+        except NotAuthenticated as exc:
+            response = JsonResponse({"detail": exc.detail}, status=status.HTTP_401_UNAUTHORIZED)
+            response["WWW-Authenticate"] = self.authentication.authenticate_header(request)
+            return response
+
+        request.user = result[0]
+        if not self.permission.has_permission(request, self):
+            return JsonResponse(
+                {"detail": self.permission.message},
+                status=status.HTTP_403_FORBIDDEN,
+            )
+
+        denial = plan_denial(request)
+        if denial:
+            return JsonResponse({"message": denial}, status=status.HTTP_403_FORBIDDEN)
+
+        return None
+
+    def prepare(self, request):
+        error = self.authorize(request)
+        if error:
+            return error, None
+
+        try:
+            user_message = str(json.loads(request.body or b"{}").get("message", "")).strip()
+        except (ValueError, AttributeError):
+            return JsonResponse({"message": "Invalid JSON body."}, status=400), None
+
+        stats = get_business_stats(request.user)
+        payload = build_payload(stats, user_message)
+        return None, (response_cache.key(user_message, stats, payload), payload)
+
+    async def post(self, request):
+        error, prepared = await sync_to_async(self.prepare)(request)
+        if error:
+            return error
+
+        cache_key, payload = prepared
+        user = request.user
+
+        cached = response_cache.get(cache_key)
+        if cached is not None:
+            async def replay():
+                yield "\u200b"
+                await sync_to_async(record_ai_request)(user)
+                for chunk in replay_chunks(cached):
+                    yield chunk
+
+            return cached_stream_response(replay())
+
+        # Under WSGI the body is consumed on another short-lived loop
+        per_request_loop = not isinstance(request, ASGIRequest)
+
+        async def stream():
+            yield "\u200b"
+
+            client = get_ollama_client()
+            chunks = []
+            done = False
+            try:
+                async with client.stream("POST", OLLAMA_GENERATE_URL, json=payload) as response:
+                    response.raise_for_status()
+                    async for raw in response.aiter_lines():
+                        text, done = parse_frame(raw)
+                        if text:
+                            if not chunks:
+                                # Metered once the model has answered
+                                await sync_to_async(record_ai_request)(user)
+                            chunks.append(text)
+                            yield text
+            except Exception:
+                logger.exception("Streaming from Ollama failed")
+                yield "\n⚠️ Streaming error."
+            else:
+                # Only complete answers are replayed
+                if done and chunks:
+                    response_cache.set(cache_key, "".join(chunks))
+            finally:
+                if per_request_loop:
+                    await client.aclose()
+
+        return StreamingHttpResponse(
+            stream(), content_type="text/plain; charset=utf-8"
+        )
@@ -3,6 +3,10 @@ ASGI config for flowmerce project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+Serve it with an ASGI server (e.g. ``uvicorn flowmerce.asgi:application``) so
+the async assistant stream at /api/assistant/stream/ runs without holding a
+worker thread per chat.
+
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
 """
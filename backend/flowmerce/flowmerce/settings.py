@@ -83,6 +83,7 @@ REST_FRAMEWORK = {
 }
 
 MIDDLEWARE = [
+    'core.middleware.instrumentation.RequestMetricsMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -90,8 +91,10 @@ MIDDLEWARE = [
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'core.middleware.subscription_middleware.SubscriptionMiddleware',
+    'core.middleware.replica.ReadYourWritesMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'core.middleware.instrumentation.ViewTimingMiddleware',
 ]
 
 CORS_ALLOWED_ORIGINS = [
@@ -155,7 +158,8 @@ WSGI_APPLICATION = 'flowmerce.wsgi.application'
 
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.mysql',
+        # django.db.backends.mysql plus a per-process connection pool
+        'ENGINE': 'core.db_backends.mysql',
         'NAME': os.environ.get('DB_NAME', 'flowmerce_dev'),
         'USER': os.environ.get('DB_USER', 'root'),
         'PASSWORD': os.environ.get('DB_PASSWORD', ''),
@@ -165,10 +169,59 @@ DATABASES = {
             'init_command': "SET sql_mode='STRICT_TRANS_TABLES'",
             'charset': 'utf8mb4',
         },
+        # Connections are borrowed per request and returned when it ends,
+        # which also works under ASGI. With DB_POOL_SIZE=0, use
+        # DB_CONN_MAX_AGE for plain persistent connections under WSGI instead.
+        'POOL': {
+            'MAX_SIZE': int(os.getenv('DB_POOL_SIZE', '10')),
+            'TIMEOUT': int(os.getenv('DB_POOL_TIMEOUT', '10')),
+            'MAX_LIFETIME': int(os.getenv('DB_POOL_MAX_LIFETIME', '3600')),
+            'CHECK_AFTER': int(os.getenv('DB_POOL_CHECK_AFTER', '30')),
+        },
+        'CONN_MAX_AGE': int(os.getenv('DB_CONN_MAX_AGE', '0')),
+        'CONN_HEALTH_CHECKS': True,
     }
 }
 
+# Optional read replica for analytics and list endpoints (core.db_routers).
+# DB_REPLICA_HOST adds a MySQL replica of the default database. Any other
+# database can stand in with DB_REPLICA_ENGINE and DB_REPLICA_NAME, e.g.
+# django.db.backends.sqlite3 and a second file for checking the routing
+# locally. Tests mirror it onto the default database.
+if os.getenv('DB_REPLICA_ENGINE'):
+    DATABASES['replica'] = {
+        'ENGINE': os.environ['DB_REPLICA_ENGINE'],
+        'NAME': os.environ['DB_REPLICA_NAME'],
+        'USER': os.getenv('DB_REPLICA_USER', ''),
+        'PASSWORD': os.getenv('DB_REPLICA_PASSWORD', ''),
+        'HOST': os.getenv('DB_REPLICA_HOST', ''),
+        'PORT': os.getenv('DB_REPLICA_PORT', ''),
+        'TEST': {'MIRROR': 'default'},
+    }
+elif os.getenv('DB_REPLICA_HOST'):
+    DATABASES['replica'] = {
+        **DATABASES['default'],
+        'NAME': os.getenv('DB_REPLICA_NAME', DATABASES['default']['NAME']),
+        'USER': os.getenv('DB_REPLICA_USER', DATABASES['default']['USER']),
+        'PASSWORD': os.getenv('DB_REPLICA_PASSWORD', DATABASES['default']['PASSWORD']),
+        'HOST': os.environ['DB_REPLICA_HOST'],
+        'PORT': os.getenv('DB_REPLICA_PORT', DATABASES['default']['PORT']),
+        'TEST': {'MIRROR': 'default'},
+    }
+
+DATABASE_ROUTERS = ['core.db_routers.ReplicaRouter']
+# How long a user's reads stay on the primary after they write
+REPLICA_PIN_SECONDS = int(os.getenv('REPLICA_PIN_SECONDS', '5'))
+
 OPENAI_API_KEY = os.getenv('OPENAI_API_KEY')
+OLLAMA_URL = os.getenv('OLLAMA_URL', 'http://localhost:11434')
+# Pooled connections per worker for the async assistant stream
+OLLAMA_MAX_CONNECTIONS = int(os.getenv('OLLAMA_MAX_CONNECTIONS', '200'))
+# Replayed assistant answers for identical questions against identical stats
+ASSISTANT_CACHE_SIZE = int(os.getenv('ASSISTANT_CACHE_SIZE', '512'))
+ASSISTANT_CACHE_TTL = int(os.getenv('ASSISTANT_CACHE_TTL', '600'))
+# Pending AI request counts are written to the database at this many per subscription
+AI_USAGE_FLUSH_THRESHOLD = int(os.getenv('AI_USAGE_FLUSH_THRESHOLD', '10'))
 RECAPTCHA_SECRET_KEY = os.getenv('RECAPTCHA_SECRET_KEY')
    
 
@@ -221,5 +274,43 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media') 
 
+# Uploads are stored under their content hash, so identical files are kept once
+STORAGES = {
+    'default': {'BACKEND': 'core.storage.ContentAddressedStorage'},
+    'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+}
+# Shared cache tier: Redis when REDIS_URL is set, otherwise a SQLite file
+# shared by the worker processes on this host (development and tests)
+REDIS_URL = os.getenv('REDIS_URL')
+if REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+            'KEY_PREFIX': 'flowmerce',
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'core.cache_backends.SQLiteCache',
+            'LOCATION': os.getenv('CACHE_SQLITE_PATH', os.path.join(BASE_DIR, 'cache.sqlite3')),
+            'OPTIONS': {'MAX_ENTRIES': 100000},
+        }
+    }
+# Per-process LRU in front of the shared tier, per core.cache namespace
+LOCAL_CACHE_SIZE = int(os.getenv('LOCAL_CACHE_SIZE', '1024'))
+
+# WebP thumbnails of product images, rendered by a per-process thread pool
+IMAGE_VARIANT_WORKERS = int(os.getenv('IMAGE_VARIANT_WORKERS', '2'))
+IMAGE_VARIANT_QUALITY = int(os.getenv('IMAGE_VARIANT_QUALITY', '80'))
+
 EMAIL_BACKEND = "django.core.mail.backends.console.EmailBackend"
 DEFAULT_FROM_EMAIL = "no-reply@flowmerce.local"
+
+# Order numbers are reserved from the counter table in blocks of this size per worker
+ORDER_NUMBER_BLOCK_SIZE = int(os.getenv('ORDER_NUMBER_BLOCK_SIZE', '20'))
+
+# Per-route query count and latency metrics, exposed as Server-Timing and at debug/metrics/
+REQUEST_METRICS_ENABLED = os.getenv('REQUEST_METRICS_ENABLED', str(DEBUG)).lower() in ('1', 'true', 'yes')
+REQUEST_METRICS_SAMPLES = int(os.getenv('REQUEST_METRICS_SAMPLES', '1000'))